@@ -0,0 +1,133 @@
+import os
+import threading
+import time
+from collections import deque
+from zoneinfo import ZoneInfo
+
+import jdatetime
+
+
+def _parse_hours(spec):
+    """'09:00-13:00,16:00-20:00' → [(540, 780), (960, 1200)] بر حسب دقیقه از نیمه‌شب"""
+    windows = []
+    for part in filter(None, (s.strip() for s in spec.split(","))):
+        start, end = part.split("-")
+        h1, m1 = map(int, start.split(":"))
+        h2, m2 = map(int, end.split(":"))
+        windows.append((h1 * 60 + m1, h2 * 60 + m2))
+    return windows
+
+
+class AdaptiveCadence:
+    """
+    تعیین فاصله بروزرسانی بر اساس سرعت تغییر قیمت‌ها و ساعات بازار
+
+    - اگر نتیجه با دفعه قبل فرق داشته باشد فاصله نصف می‌شود (تا min_interval)
+    - اگر یکسان باشد فاصله دو برابر می‌شود (تا max_interval)
+    - خارج از ساعات بازار، جمعه‌ها و تعطیلات فاصله closed_interval است
+    - تعداد درخواست به upstream در هر ساعت از hourly_budget بیشتر نمی‌شود
+    """
+
+    def __init__(
+        self,
+        base_interval=600,
+        min_interval=60,
+        max_interval=1800,
+        closed_interval=3600,
+        market_hours="09:00-21:00",
+        closed_weekdays=(6,),
+        holidays=(),
+        hourly_budget=60,
+        tz="Asia/Tehran",
+    ):
+        self.base_interval = base_interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.closed_interval = closed_interval
+        self.market_windows = _parse_hours(market_hours)
+        # jdatetime: شنبه=0 ... جمعه=6
+        self.closed_weekdays = set(closed_weekdays)
+        self.holidays = set(holidays)
+        self.hourly_budget = hourly_budget
+        self.tz = ZoneInfo(tz)
+
+        self.interval = base_interval
+        self.current = base_interval
+        self._requests = deque()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        env = os.environ.get
+        return cls(
+            base_interval=int(env("REFRESH_INTERVAL", 600)),
+            min_interval=int(env("REFRESH_MIN_INTERVAL", 60)),
+            max_interval=int(env("REFRESH_MAX_INTERVAL", 1800)),
+            closed_interval=int(env("REFRESH_CLOSED_INTERVAL", 3600)),
+            market_hours=env("MARKET_HOURS", "09:00-21:00"),
+            closed_weekdays=[int(d) for d in env("MARKET_CLOSED_WEEKDAYS", "6").split(",") if d.strip()],
+            holidays=[d.strip() for d in env("MARKET_HOLIDAYS", "").split(",") if d.strip()],
+            hourly_budget=int(env("UPSTREAM_HOURLY_BUDGET", 60)),
+            tz=env("MARKET_TZ", "Asia/Tehran"),
+        )
+
+    def market_open(self, now=None):
+        """آیا الان (به وقت شمسی) بازار باز است؟"""
+        now = now or jdatetime.datetime.now(self.tz)
+        if now.weekday() in self.closed_weekdays:
+            return False
+        if now.strftime("%Y/%m/%d") in self.holidays:
+            return False
+        minute = now.hour * 60 + now.minute
+        return any(start <= minute < end for start, end in self.market_windows)
+
+    def _prune(self, now):
+        while self._requests and now - self._requests[0] >= 3600:
+            self._requests.popleft()
+
+    def note_request(self, now=None):
+        """ثبت یک درخواست به upstream در بودجه ساعتی"""
+        now = time.time() if now is None else now
+        with self._lock:
+            self._prune(now)
+            self._requests.append(now)
+
+    def budget_exhausted(self, now=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            self._prune(now)
+            return len(self._requests) >= self.hourly_budget
+
+    def next_interval(self, changed, now=None):
+        """محاسبه فاصله تا بروزرسانی بعدی؛ changed=None یعنی درخواست ناموفق بود"""
+        now = time.time() if now is None else now
+        is_open = self.market_open()
+        with self._lock:
+            if not is_open:
+                interval = self.closed_interval
+            elif changed is None:
+                interval = self.interval
+            elif changed:
+                interval = max(self.min_interval, self.interval / 2)
+            else:
+                interval = min(self.max_interval, self.interval * 2)
+            # بعد از باز شدن بازار از فاصله پایه شروع می‌کنیم
+            self.interval = interval if is_open else self.base_interval
+
+            # اگر بودجه ساعتی تمام شده، تا آزاد شدن قدیمی‌ترین درخواست صبر کن
+            self._prune(now)
+            if len(self._requests) >= self.hourly_budget:
+                interval = max(interval, self._requests[0] + 3600 - now)
+            self.current = int(interval)
+            return self.current
+
+    def state(self):
+        with self._lock:
+            self._prune(time.time())
+            used = len(self._requests)
+        return {
+            "interval_seconds": self.current,
+            "market_open": self.market_open(),
+            "requests_last_hour": used,
+            "hourly_budget": self.hourly_budget,
+        }
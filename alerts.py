@@ -0,0 +1,236 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+
+from api_scraper import import_httpx
+from metrics import ALERT_DELIVERIES, ALERT_DROPPED, ALERT_EVENTS, ALERT_QUEUE
+
+logger = logging.getLogger(__name__)
+
+ALERTS_FILE = os.environ.get("ALERTS_FILE", "alerts.json")
+
+# فیلدهای مجاز هر قانون هشدار
+_RULE_FIELDS = {"name", "match", "side", "change_abs", "change_percent", "spread_widen", "active_flip"}
+_SIDES = {"buy": ("buy",), "sell": ("sell",), "both": ("buy", "sell")}
+
+
+class AlertRuleError(ValueError):
+    pass
+
+
+class AlertRule:
+    """
+    یک قانون هشدار
+
+    change_abs / change_percent: تغییر قیمت (تومان / درصد) در سمت خرید، فروش یا هر دو
+    spread_widen: افزایش اختلاف فروش و خرید حداقل به این مقدار (تومان)
+    active_flip: فعال/غیرفعال شدن محصول
+    """
+
+    def __init__(self, spec):
+        if not isinstance(spec, dict):
+            raise AlertRuleError("alert rule must be an object")
+        unknown = set(spec) - _RULE_FIELDS
+        if unknown:
+            raise AlertRuleError(f"unknown alert rule fields: {', '.join(sorted(unknown))}")
+        side = spec.get("side", "both")
+        if side not in _SIDES:
+            raise AlertRuleError("side must be one of buy, sell, both")
+
+        match = spec.get("match") or {}
+        ids = match.get("ids")
+        self.ids = frozenset(int(i) for i in ids) if ids is not None else None
+        self.sides = _SIDES[side]
+        self.change_abs = float(spec["change_abs"]) if "change_abs" in spec else None
+        self.change_percent = float(spec["change_percent"]) if "change_percent" in spec else None
+        self.spread_widen = float(spec["spread_widen"]) if "spread_widen" in spec else None
+        self.active_flip = bool(spec.get("active_flip", False))
+        self.name = spec.get("name") or "rule"
+
+    def matches(self, sid):
+        return self.ids is None or sid in self.ids
+
+
+def load_alerts(path=ALERTS_FILE):
+    """
+    خواندن تنظیمات هشدار از فایل JSON:
+    {"webhooks": ["https://..."], "rules": [{"change_percent": 1, "match": {"ids": [3]}}, ...]}
+
+    آدرس‌های ALERT_WEBHOOKS (جداشده با کاما) هم به webhooks اضافه می‌شوند.
+    """
+    config = {"webhooks": [], "rules": []}
+    if os.path.exists(path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                config.update(json.load(f))
+        except Exception as e:
+            logger.error(f"Error loading alerts: {e}")
+    webhooks = list(config["webhooks"])
+    webhooks += [u.strip() for u in os.environ.get("ALERT_WEBHOOKS", "").split(",") if u.strip()]
+
+    rules = []
+    for spec in config["rules"]:
+        try:
+            rules.append(AlertRule(spec))
+        except (AlertRuleError, TypeError, ValueError) as e:
+            logger.error(f"Invalid alert rule {spec!r}: {e}")
+    return webhooks, rules
+
+
+def evaluate(rules, old_prices, new_prices, now=None):
+    """
+    مقایسه اسنپ‌شات جدید با قبلی و تولید رویدادهای هشدار
+
+    هر ردیف فقط یک بار پیمایش می‌شود و همه قوانین روی همان ردیف بررسی می‌شوند.
+    """
+    if not rules or not old_prices:
+        return []
+    now = time.time() if now is None else now
+    old_by_id = {p["id"]: p for p in old_prices}
+    events = []
+
+    for new in new_prices:
+        old = old_by_id.get(new["id"])
+        if old is None:
+            continue
+        base = {"id": new["id"], "name": new["name"], "at": now}
+        old_spread = old["sell_price"] - old["buy_price"]
+        new_spread = new["sell_price"] - new["buy_price"]
+        for rule in rules:
+            if not rule.matches(new["id"]):
+                continue
+
+            if rule.change_abs is not None or rule.change_percent is not None:
+                for side in rule.sides:
+                    before = old[f"{side}_price"]
+                    after = new[f"{side}_price"]
+                    change = after - before
+                    percent = change / before * 100 if before else None
+                    if (
+                        (rule.change_abs is not None and abs(change) >= rule.change_abs)
+                        or (rule.change_percent is not None and percent is not None
+                            and abs(percent) >= rule.change_percent)
+                    ):
+                        events.append(dict(
+                            base, type="move", rule=rule.name, side=side, old=before, new=after,
+                            change=change, change_percent=round(percent, 3) if percent is not None else None,
+                        ))
+
+            if rule.spread_widen is not None and new_spread - old_spread >= rule.spread_widen:
+                events.append(dict(
+                    base, type="spread", rule=rule.name, old=old_spread, new=new_spread,
+                    change=new_spread - old_spread,
+                ))
+
+            if rule.active_flip and bool(old["is_active"]) != bool(new["is_active"]):
+                events.append(dict(
+                    base, type="active", rule=rule.name, old=bool(old["is_active"]), new=bool(new["is_active"]),
+                ))
+
+    for event in events:
+        ALERT_EVENTS.inc(type=event["type"])
+    return events
+
+
+class AlertDispatcher:
+    """
+    صف محدود ارسال هشدار به webhook ها روی loop پس‌زمینه
+
+    submit() از هر thread صدا زده می‌شود و منتظر نمی‌ماند. رویدادها در
+    دسته‌های حداکثر batch_size (یا هر batch_wait ثانیه) با POST فرستاده
+    می‌شوند؛ خطاهای موقت با backoff دوباره تلاش می‌شوند. اگر صف پر باشد
+    قدیمی‌ترین رویدادها کنار گذاشته می‌شوند تا بروزرسانی قیمت هرگز معطل نشود.
+    """
+
+    def __init__(self, webhooks, max_queue=1000, batch_size=50, batch_wait=1.0,
+                 attempts=4, base_delay=1.0, max_delay=30.0, timeout=10.0):
+        self.webhooks = list(webhooks)
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.timeout = timeout
+        self._loop = None
+        self._queue = None
+        self._client = None
+        ALERT_QUEUE.set_function(lambda: self._queue.qsize() if self._queue else 0)
+
+    def start(self, upstream):
+        """شروع حلقه ارسال روی UpstreamLoop"""
+        if not self.webhooks:
+            return
+        upstream.run(self._setup(), timeout=5)
+        upstream.submit(self._run())
+
+    async def _setup(self):
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+
+    def submit(self, events):
+        if not events or self._loop is None:
+            return
+        self._loop.call_soon_threadsafe(self._enqueue, events)
+
+    def _enqueue(self, events):
+        for event in events:
+            if self._queue.full():
+                self._queue.get_nowait()
+                ALERT_DROPPED.inc()
+            self._queue.put_nowait(event)
+
+    async def _run(self):
+        # httpx فقط وقتی webhook داریم و بعد از شروع برنامه import می‌شود
+        httpx = import_httpx()
+        self._client = httpx.AsyncClient(timeout=self.timeout)
+        while True:
+            batch = [await self._queue.get()]
+            deadline = self._loop.time() + self.batch_wait
+            while len(batch) < self.batch_size:
+                remaining = deadline - self._loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            # خطای یک webhook نباید حلقه ارسال را متوقف کند
+            await asyncio.gather(*(self._deliver(url, batch) for url in self.webhooks), return_exceptions=True)
+
+    async def _deliver(self, url, batch):
+        try:
+            return await self._post_batch(url, batch)
+        except Exception:
+            # مثلاً آدرس نامعتبر webhook یا رویدادی که JSON نمی‌شود
+            logger.exception("webhook %s delivery error, dropping %d events", url, len(batch))
+            ALERT_DELIVERIES.inc(result="failed")
+            return False
+
+    async def _post_batch(self, url, batch):
+        httpx = import_httpx()
+
+        payload = {"events": batch, "sent_at": time.time()}
+        for attempt in range(self.attempts):
+            try:
+                r = await self._client.post(url, json=payload)
+                if r.status_code < 300:
+                    ALERT_DELIVERIES.inc(result="ok")
+                    return True
+                # خطای کلاینت (غیر از 429) با تلاش دوباره درست نمی‌شود
+                if r.status_code < 500 and r.status_code != 429:
+                    logger.error("webhook %s rejected %d events: HTTP %d", url, len(batch), r.status_code)
+                    ALERT_DELIVERIES.inc(result="rejected")
+                    return False
+                reason = f"HTTP {r.status_code}"
+            except httpx.HTTPError as e:
+                reason = repr(e)
+            if attempt < self.attempts - 1:
+                ALERT_DELIVERIES.inc(result="retry")
+                await asyncio.sleep(random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt)))
+        logger.error("webhook %s failed, dropping %d events: %s", url, len(batch), reason)
+        ALERT_DELIVERIES.inc(result="failed")
+        return False
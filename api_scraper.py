@@ -1,69 +1,135 @@
-import requests
+import asyncio
+import importlib
+import logging
+import os
+import sys
+import threading
+
 from datetime import datetime
 
-class ShirazSilverAPI:
-    """دریافت قیمت نقره از API ساچمه‌خانه شیراز"""
+from homepage import HomepageParser
+from metrics import UPSTREAM_ERRORS, UPSTREAM_LATENCY, UPSTREAM_RESPONSES
+from price_model import SilverPrice
+
+logger = logging.getLogger(__name__)
+
+# قابل تغییر برای اجرا روی سرور replay محلی (bench/replay_server.py)
+BASE_URL = os.environ.get("SHIRAZ_API_BASE_URL", "https://api.shirazgoldandsilver.ir/api/v1")
+WEBSITE_URL = "https://shirazgoldandsilver.ir"
+
+# timeout جدا برای برقراری اتصال و خواندن پاسخ (ثانیه)
+CONNECT_TIMEOUT = 5
+READ_TIMEOUT = 15
+
+# سه ردیفی که قیمتشان از فیلدهای gheram خوانده می‌شود؛ اگر GHERAM_IDS تنظیم
+# نشده باشد، id آن‌ها از روی این عنوان‌ها پیدا می‌شود
+SPECIAL_TITLES = frozenset({
+    "ساچمه عیار 999.9",
+    "ساچمه عیار 999",
+    "ساچمه عیار 995",
+})
+GHERAM_IDS = frozenset(int(i) for i in os.environ.get("GHERAM_IDS", "").split(",") if i.strip())
+
+# اندازه pool اتصال‌های keep-alive به upstream
+POOL_SIZE = 4
+KEEPALIVE_EXPIRY = 60
+
+
+def import_httpx():
+    """
+    import httpx؛ زیر worker های gevent بدون import کردن trio
+
+    httpcore اگر trio نصب باشد (وابستگی selenium برای PRICE_FALLBACK=scraper)
+    آن را import می‌کند و trio روی select پچ‌شده gevent (بدون epoll) خطا
+    می‌دهد. کلاینت‌های ما روی asyncio هستند و backend trio را لازم ندارند.
+    """
+    if "httpx" not in sys.modules and "trio" not in sys.modules:
+        monkey = sys.modules.get("gevent.monkey")
+        if monkey is not None and monkey.is_module_patched("select"):
+            # None در sys.modules یعنی ImportError؛ httpcore آن را نبودن trio می‌داند
+            sys.modules["trio"] = None
+            try:
+                return importlib.import_module("httpx")
+            finally:
+                del sys.modules["trio"]
+    return importlib.import_module("httpx")
+
+
+def is_transient_error(e):
+    """خطای شبکه/timeout که با تلاش دوباره ممکن است برطرف شود"""
+    transient = (TimeoutError,)
+    # httpx و requests با اولین کلاینت import می‌شوند؛ خطای کتابخانه‌ای که
+    # بارگذاری نشده پیش نمی‌آید
+    httpx = sys.modules.get("httpx")
+    if httpx is not None:
+        transient += (httpx.TransportError,)
+    requests = sys.modules.get("requests")
+    if requests is not None:
+        transient += (requests.ConnectionError, requests.Timeout)
+    return isinstance(e, transient)
+
+
+def is_transient(res):
+    """آیا نتیجه ناموفق یک فراخوانی ارزش تلاش دوباره دارد؟ (خطای شبکه، 429 یا 5xx)"""
+    if res.get("success"):
+        return False
+    status = res.get("status")
+    return bool(res.get("transient")) or status == 429 or (status or 0) >= 500
+
+
+class _ShirazSilverBase:
+    """منطق مشترک (هدرها، توکن و پارس پاسخ‌ها) بین کلاینت همگام و ناهمگام"""
 
     def __init__(self):
-        self.base_url = "https://api.shirazgoldandsilver.ir/api/v1"
-        self.website_url = "https://shirazgoldandsilver.ir"
-        self.session = requests.Session()
+        self.base_url = BASE_URL
+        self.website_url = WEBSITE_URL
         self.is_logged_in = False
         self.token = None
-
-        self.session.headers.update({
+        self.gheram_ids = GHERAM_IDS or None
+        self.homepage = HomepageParser(SPECIAL_TITLES)
+        self.headers = {
             "User-Agent": "Mozilla/5.0",
             "Accept": "application/json, text/plain, */*",
             "Content-Type": "application/json",
             "Origin": self.website_url,
             "Referer": f"{self.website_url}/",
-        })
+        }
 
-    def send_otp(self, mobile):
-        """ارسال کد تایید به شماره موبایل"""
-        try:
-            url = f"{self.base_url}/auth/check-mobile-exists"
-            r = self.session.post(url, json={"mobile": mobile}, timeout=30)
-            print("send_otp status:", r.status_code)
-            if r.status_code != 200:
-                return {"success": False, "message": f"HTTP {r.status_code}"}
-            data = r.json()
-            if not data.get("success"):
-                return {"success": False, "message": data.get("message", "خطا")}
-            if not data.get("data", {}).get("exists"):
-                return {"success": False, "message": "شماره موبایل موجود نیست"}
-            return {"success": True, "message": "کد ارسال شد"}
-        except Exception as e:
-            print("send_otp error:", e)
-            return {"success": False, "message": str(e)}
+    def set_token(self, token):
+        """تنظیم توکن Bearer (مثلاً بعد از بازیابی از فایل)"""
+        self.token = token
+        self.headers["Authorization"] = f"Bearer {token}"
+        self.is_logged_in = True
 
-    def verify_otp(self, mobile, code):
-        """تایید کد تایید و ورود"""
-        try:
-            url = f"{self.base_url}/auth/login"
-            payload = {"mobile": mobile, "otp": code, "password": None, "type": "otp"}
-            print("verify_otp →", url, payload)
-            r = self.session.post(url, json=payload, timeout=30)
-            print("verify_otp status:", r.status_code)
-            if r.status_code != 200:
-                return {"success": False, "message": f"HTTP {r.status_code}"}
-            data = r.json()
-            if not data.get("success"):
-                return {"success": False, "message": data.get("message", "کد اشتباه")}
-            token = data.get("data", {}).get("token")
-            if token:
-                self.token = token
-                self.session.headers["Authorization"] = f"Bearer {token}"
-                self.is_logged_in = True
-                print("Token set")
-            return {"success": True, "message": "ورود موفق"}
-        except Exception as e:
-            print("verify_otp error:", e)
-            return {"success": False, "message": str(e)}
+    def _otp_result(self, status_code, data):
+        if status_code != 200:
+            return {"success": False, "status": status_code, "message": f"HTTP {status_code}"}
+        if not data.get("success"):
+            return {"success": False, "message": data.get("message", "خطا")}
+        if not data.get("data", {}).get("exists"):
+            return {"success": False, "message": "شماره موبایل موجود نیست"}
+        return {"success": True, "message": "کد ارسال شد"}
+
+    def _login_result(self, status_code, data):
+        if status_code != 200:
+            return {"success": False, "status": status_code, "message": f"HTTP {status_code}"}
+        if not data.get("success"):
+            return {"success": False, "message": data.get("message", "کد اشتباه")}
+        token = data.get("data", {}).get("token")
+        if token:
+            self.set_token(token)
+            logger.info("token set", extra={"event": "token_set"})
+        return {"success": True, "message": "ورود موفق"}
 
-    def get_silver_prices(self):
+    def _parse_homepage(self, r, category_ids=None):
+        """پارس بدنه /profile/homepage (HomepageData)؛ برای پاسخ غیر 200 None"""
+        return self.homepage.parse(r.content, category_ids) if r.status_code == 200 else None
+
+    def _prices_result(self, status_code, page, category_id=None):
         """
-        دریافت لیست نقره (فقط ۹ ردیف)
+        تبدیل پاسخ /profile/homepage (HomepageData) به لیست نقره (فقط ۹ ردیف)
+
+        category_id: دسته قیمت مورد نظر؛ پیش‌فرض دسته خود کاربر (user_category_id)
         
         منطق قیمت‌گذاری (همه قیمت‌ها به تومان هستند):
         - سه ردیف: ساچمه عیار 999.9، ساچمه عیار 999، ساچمه عیار 995
@@ -74,102 +140,270 @@ class ShirazSilverAPI:
           buy_price_base  → از buy_price
           sell_price_base → از sell_price
         """
+        if status_code != 200:
+            return {"success": False, "status": status_code, "prices": [], "message": f"HTTP {status_code}"}
+
+        if not page.success:
+            return {"success": False, "prices": [], "message": page.message or "خطا"}
+
+        # ردیف‌های دسته‌بندی کاربر
+        user_silvers = page.silvers(category_id)
+        if user_silvers is None:
+            logger.warning("user category not found", extra={"event": "category_missing", "category_id": category_id})
+            return {"success": False, "prices": [], "message": "دسته کاربر پیدا نشد"}
+
+        # map اطلاعات تکمیلی (کش‌شده تا وقتی features_data عوض نشود)
+        info_map = page.features.info
+
+        buy_status_global = page.buy_status
+        sell_status_global = page.sell_status
+
+        # سه ردیف خاص که باید از gheram استفاده کنند (بر اساس id)
+        gheram_ids = self.gheram_ids
+        if gheram_ids is None:
+            gheram_ids = page.features.special_ids
+
+        prices = []
+        for it in user_silvers:
+            sid = it.get("id")
+            info = info_map.get(sid, {})
+
+            title = info.get("title", "محصول نقره")
+
+            # تشخیص اینکه از کدام فیلد استفاده کنیم
+            if sid in gheram_ids:
+                # برای سه ردیف خاص: از gheram (تومان)
+                buy_base = int(it.get("buy_price_gheram", 0))
+                sell_base = int(it.get("sell_price_gheram", 0))
+                field = "gheram"
+            else:
+                # برای بقیه: از buy_price و sell_price (تومان)
+                buy_base = int(it.get("buy_price", 0))
+                sell_base = int(it.get("sell_price", 0))
+                field = "standard"
+            logger.debug("price row", extra={
+                "event": "price_row", "id": sid, "title": title, "field": field, "buy": buy_base, "sell": sell_base,
+            })
+
+            b_status = 1 if info.get("buy_status", 1) and buy_status_global else 0
+            s_status = 1 if info.get("sell_status", 1) and sell_status_global else 0
+
+            # buy_price/sell_price بعداً در app.py با قوانین قیمت‌گذاری محاسبه می‌شوند
+            prices.append(SilverPrice(sid, title, buy_base, sell_base, buy_status=b_status, sell_status=s_status))
+
+        prices = prices[:9]  # فقط ۹ ردیف
+
+        return {"success": True, "prices": prices, "message": "ok"}
+
+
+class ShirazSilverAPI(_ShirazSilverBase):
+    """دریافت قیمت نقره از API ساچمه‌خانه شیراز"""
+
+    def __init__(self):
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        super().__init__()
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.timeout = (CONNECT_TIMEOUT, READ_TIMEOUT)
+
+    def set_token(self, token):
+        super().set_token(token)
+        self.session.headers["Authorization"] = f"Bearer {token}"
+
+    def send_otp(self, mobile):
+        """ارسال کد تایید به شماره موبایل"""
+        try:
+            url = f"{self.base_url}/auth/check-mobile-exists"
+            with UPSTREAM_LATENCY.time(op="send_otp"):
+                r = self.session.post(url, json={"mobile": mobile}, timeout=self.timeout)
+            UPSTREAM_RESPONSES.inc(op="send_otp", status=r.status_code)
+            logger.info("upstream response", extra={"event": "upstream_response", "op": "send_otp", "status": r.status_code})
+            return self._otp_result(r.status_code, r.json() if r.status_code == 200 else {})
+        except Exception as e:
+            logger.warning("upstream error: %s", e, extra={"event": "upstream_error", "op": "send_otp"})
+            UPSTREAM_ERRORS.inc(op="send_otp")
+            return {"success": False, "transient": is_transient_error(e), "message": str(e)}
+
+    def verify_otp(self, mobile, code):
+        """تایید کد تایید و ورود"""
+        try:
+            url = f"{self.base_url}/auth/login"
+            payload = {"mobile": mobile, "otp": code, "password": None, "type": "otp"}
+            logger.info("upstream request", extra={"event": "upstream_request", "op": "verify_otp", "url": url})
+            with UPSTREAM_LATENCY.time(op="verify_otp"):
+                r = self.session.post(url, json=payload, timeout=self.timeout)
+            UPSTREAM_RESPONSES.inc(op="verify_otp", status=r.status_code)
+            logger.info("upstream response", extra={"event": "upstream_response", "op": "verify_otp", "status": r.status_code})
+            return self._login_result(r.status_code, r.json() if r.status_code == 200 else {})
+        except Exception as e:
+            logger.warning("upstream error: %s", e, extra={"event": "upstream_error", "op": "verify_otp"})
+            UPSTREAM_ERRORS.inc(op="verify_otp")
+            return {"success": False, "transient": is_transient_error(e), "message": str(e)}
+
+    def get_silver_prices(self, category_id=None):
+        """دریافت لیست نقره (فقط ۹ ردیف)"""
         try:
             url = f"{self.base_url}/profile/homepage"
-            print("get_silver_prices →", url)
-            r = self.session.get(url, timeout=30)
-            print("prices status:", r.status_code)
-            if r.status_code != 200:
-                return {"success": False, "prices": [], "message": f"HTTP {r.status_code}"}
-
-            data = r.json()
-            if not data.get("success"):
-                return {"success": False, "prices": [], "message": data.get("message", "خطا")}
-
-            main = data.get("data", {})
-
-            # پیدا کردن دسته‌بندی کاربر
-            user_category_id = main.get("user_category_id")
-            user_category = None
-            for cat in main.get("user_categories", []):
-                if cat.get("id") == user_category_id:
-                    user_category = cat
-                    break
-            if not user_category:
-                print("user_category not found")
-                return {"success": False, "prices": [], "message": "دسته کاربر پیدا نشد"}
-
-            user_silvers = user_category.get("silvers", [])
-
-            # map اطلاعات تکمیلی
-            info_map = {}
-            for it in main.get("features_data", {}).get("silver", []):
-                info_map[it.get("id")] = it
-
-            buy_status_global = main.get("buy_status", 1)
-            sell_status_global = main.get("sell_status", 1)
-
-            # سه ردیف خاص که باید از gheram استفاده کنند
-            special_titles = {
-                "ساچمه عیار 999.9",
-                "ساچمه عیار 999",
-                "ساچمه عیار 995",
-            }
+            logger.info("upstream request", extra={"event": "upstream_request", "op": "get_silver_prices", "url": url})
+            with UPSTREAM_LATENCY.time(op="get_silver_prices"):
+                r = self.session.get(url, timeout=self.timeout)
+            UPSTREAM_RESPONSES.inc(op="get_silver_prices", status=r.status_code)
+            logger.info("upstream response", extra={"event": "upstream_response", "op": "get_silver_prices", "status": r.status_code})
+            return self._prices_result(r.status_code, self._parse_homepage(r, [category_id]), category_id)
+        except Exception as e:
+            logger.exception("upstream error", extra={"event": "upstream_error", "op": "get_silver_prices"})
+            UPSTREAM_ERRORS.inc(op="get_silver_prices")
+            return {"success": False, "transient": is_transient_error(e), "prices": [], "message": str(e)}
+
+
+class AsyncShirazSilverAPI(_ShirazSilverBase):
+    """
+    نسخه ناهمگام ShirazSilverAPI روی httpx
+
+    اتصال‌ها در یک pool محدود با keep-alive نگه داشته می‌شوند و timeout
+    اتصال و خواندن جدا هستند؛ منطق پارس پاسخ‌ها با نسخه همگام یکی است.
+    """
 
-            prices = []
-            for it in user_silvers:
-                sid = it.get("id")
-                info = info_map.get(sid, {})
-
-                title = info.get("title", "محصول نقره")
-
-                # تشخیص اینکه از کدام فیلد استفاده کنیم
-                if title in special_titles:
-                    # برای سه ردیف خاص: از gheram (تومان)
-                    buy_base = int(it.get("buy_price_gheram", 0))
-                    sell_base = int(it.get("sell_price_gheram", 0))
-                    print(f"✅ {title} (gheram) → buy={buy_base:,}, sell={sell_base:,}")
-                else:
-                    # برای بقیه: از buy_price و sell_price (تومان)
-                    buy_base = int(it.get("buy_price", 0))
-                    sell_base = int(it.get("sell_price", 0))
-                    print(f"📊 {title} (standard) → buy={buy_base:,}, sell={sell_base:,}")
-
-                b_status = 1 if info.get("buy_status", 1) and buy_status_global else 0
-                s_status = 1 if info.get("sell_status", 1) and sell_status_global else 0
-                is_active = bool(b_status or s_status)
-
-                prices.append({
-                    "id": sid,
-                    "name": title,
-                    "buy_price_base": buy_base,   # قیمت اصلی (تومان)
-                    "sell_price_base": sell_base,
-                    "buy_price": buy_base,        # بعداً در app.py درصد روی این اعمال می‌شود
-                    "sell_price": sell_base,
-                    "buy_status": b_status,
-                    "sell_status": s_status,
-                    "is_active": is_active,
-                    "status_text": "فعال" if is_active else "غیرفعال",
-                })
-
-            prices = prices[:9]  # فقط ۹ ردیف
-
-            return {"success": True, "prices": prices, "message": "ok"}
+    def __init__(self, pool_size=POOL_SIZE):
+        super().__init__()
+        self.pool_size = pool_size
+        self._client = None
+
+    def _get_client(self):
+        # کلاینت باید داخل همان event loop که از آن استفاده می‌کند ساخته شود
+        if self._client is None:
+            httpx = import_httpx()
+            self._client = httpx.AsyncClient(
+                headers=self.headers,
+                timeout=httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT),
+                limits=httpx.Limits(
+                    max_connections=self.pool_size,
+                    max_keepalive_connections=self.pool_size,
+                    keepalive_expiry=KEEPALIVE_EXPIRY,
+                ),
+            )
+        return self._client
+
+    def set_token(self, token):
+        super().set_token(token)
+        if self._client is not None:
+            self._client.headers["Authorization"] = f"Bearer {token}"
+
+    async def send_otp(self, mobile):
+        """ارسال کد تایید به شماره موبایل"""
+        try:
+            url = f"{self.base_url}/auth/check-mobile-exists"
+            with UPSTREAM_LATENCY.time(op="send_otp"):
+                r = await self._get_client().post(url, json={"mobile": mobile})
+            UPSTREAM_RESPONSES.inc(op="send_otp", status=r.status_code)
+            logger.info("upstream response", extra={"event": "upstream_response", "op": "send_otp", "status": r.status_code})
+            return self._otp_result(r.status_code, r.json() if r.status_code == 200 else {})
         except Exception as e:
-            import traceback
-            traceback.print_exc()
-            return {"success": False, "prices": [], "message": str(e)}
+            logger.warning("upstream error: %s", e, extra={"event": "upstream_error", "op": "send_otp"})
+            UPSTREAM_ERRORS.inc(op="send_otp")
+            return {"success": False, "transient": is_transient_error(e), "message": str(e)}
+
+    async def verify_otp(self, mobile, code):
+        """تایید کد تایید و ورود"""
+        try:
+            url = f"{self.base_url}/auth/login"
+            payload = {"mobile": mobile, "otp": code, "password": None, "type": "otp"}
+            logger.info("upstream request", extra={"event": "upstream_request", "op": "verify_otp", "url": url})
+            with UPSTREAM_LATENCY.time(op="verify_otp"):
+                r = await self._get_client().post(url, json=payload)
+            UPSTREAM_RESPONSES.inc(op="verify_otp", status=r.status_code)
+            logger.info("upstream response", extra={"event": "upstream_response", "op": "verify_otp", "status": r.status_code})
+            return self._login_result(r.status_code, r.json() if r.status_code == 200 else {})
+        except Exception as e:
+            logger.warning("upstream error: %s", e, extra={"event": "upstream_error", "op": "verify_otp"})
+            UPSTREAM_ERRORS.inc(op="verify_otp")
+            return {"success": False, "transient": is_transient_error(e), "message": str(e)}
+
+    async def get_silver_prices(self, category_id=None):
+        """دریافت لیست نقره (فقط ۹ ردیف)"""
+        try:
+            url = f"{self.base_url}/profile/homepage"
+            logger.info("upstream request", extra={"event": "upstream_request", "op": "get_silver_prices", "url": url})
+            with UPSTREAM_LATENCY.time(op="get_silver_prices"):
+                r = await self._get_client().get(url)
+            UPSTREAM_RESPONSES.inc(op="get_silver_prices", status=r.status_code)
+            logger.info("upstream response", extra={"event": "upstream_response", "op": "get_silver_prices", "status": r.status_code})
+            return self._prices_result(r.status_code, self._parse_homepage(r, [category_id]), category_id)
+        except Exception as e:
+            logger.exception("upstream error", extra={"event": "upstream_error", "op": "get_silver_prices"})
+            UPSTREAM_ERRORS.inc(op="get_silver_prices")
+            return {"success": False, "transient": is_transient_error(e), "prices": [], "message": str(e)}
+
+    async def get_category_prices(self, category_ids):
+        """دریافت قیمت چند دسته با یک درخواست؛ خروجی: {category_id: نتیجه}"""
+        try:
+            url = f"{self.base_url}/profile/homepage"
+            with UPSTREAM_LATENCY.time(op="get_silver_prices"):
+                r = await self._get_client().get(url)
+            UPSTREAM_RESPONSES.inc(op="get_silver_prices", status=r.status_code)
+            logger.info("upstream response", extra={"event": "upstream_response", "op": "get_silver_prices", "status": r.status_code})
+            page = self._parse_homepage(r, category_ids)
+            return {cid: self._prices_result(r.status_code, page, cid) for cid in category_ids}
+        except Exception as e:
+            UPSTREAM_ERRORS.inc(op="get_silver_prices")
+            transient = is_transient_error(e)
+            return {
+                cid: {"success": False, "transient": transient, "prices": [], "message": str(e)}
+                for cid in category_ids
+            }
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+class UpstreamLoop:
+    """
+    یک event loop در thread پس‌زمینه برای اجرای کوروتین‌های upstream
+
+    همه درخواست‌های ناهمگام روی همین loop اجرا می‌شوند؛ scheduler و route ها
+    فقط منتظر نتیجه می‌مانند و thread سیستم‌عاملی جدیدی اشغال نمی‌شود.
+    """
+
+    def __init__(self):
+        self._loop = None
+        self._lock = threading.Lock()
+
+    def _ensure_loop(self):
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                t = threading.Thread(target=self._loop.run_forever, name="upstream-loop", daemon=True)
+                t.start()
+            return self._loop
+
+    def submit(self, coro):
+        """زمان‌بندی کوروتین و برگرداندن concurrent.futures.Future"""
+        return asyncio.run_coroutine_threadsafe(coro, self._ensure_loop())
+
+    def run(self, coro, timeout=None):
+        """اجرای کوروتین و انتظار برای نتیجه"""
+        return self.submit(coro).result(timeout)
 
 
 if __name__ == "__main__":
+    from logs import setup_logging
+
+    setup_logging(fmt="text")
     api = ShirazSilverAPI()
     mobile = input("Mobile: ")
     r = api.send_otp(mobile)
-    print(r)
+    logger.info("send_otp: %s", r)
     if r["success"]:
         code = input("Code: ")
         v = api.verify_otp(mobile, code)
-        print(v)
+        logger.info("verify_otp: %s", v)
         if v["success"]:
             prices = api.get_silver_prices()
-            print(prices)
+            logger.info("prices: %s", prices)
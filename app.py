@@ -1,40 +1,193 @@
-from flask import Flask, render_template, request, jsonify, redirect, url_for
-from api_scraper import ShirazSilverAPI
+from flask import Flask, Response, g, render_template, request, jsonify, redirect, url_for
+from flask.json.provider import DefaultJSONProvider
+from werkzeug.middleware.proxy_fix import ProxyFix
+from api_scraper import AsyncShirazSilverAPI, UpstreamLoop, CONNECT_TIMEOUT, READ_TIMEOUT
+from broker import PriceBroker, changed_rows
+from fetch_engine import FetchEngine, load_accounts
+from persistence import JsonStore
+from adaptive import AdaptiveCadence
+from singleflight import SingleFlight
+from resilience import CircuitBreaker
+from token_manager import TokenManager
+from pricing_rules import PricingRules, RuleError, parse_percent
+from price_model import SilverPrice, json_default, reuse_unchanged
+from price_sources import ApiSource, FailoverSource, ScraperSource
+from alerts import AlertDispatcher, evaluate as evaluate_alerts, load_alerts
+from metrics import (
+    REGISTRY, CACHE_HITS, CACHE_MISSES, HTTP_LATENCY, HTTP_NOT_MODIFIED,
+    PRICES_STALENESS, RATE_LIMITED, UPDATE_DURATION, UPDATE_RESULTS,
+)
+from ratelimit import Limit, RateLimiter, bucket_store_from_env
+from snapshot import PriceSnapshot, build_snapshot, snapshot_response
+from shared_state import shared_state_from_env
+from logs import setup_logging
 from apscheduler.schedulers.background import BackgroundScheduler
 import jdatetime
 from datetime import datetime
 import os
-import threading
+import time
 import logging
-import sys
-import json
+import threading
 
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(message)s",
-    handlers=[logging.StreamHandler(sys.stdout)],
-)
+# لاگ از طریق صف؛ نوشتن روی stdout در thread جدا و هیچ route منتظر آن نمی‌ماند
+setup_logging()
+# اجرای job های scheduler (follow_shared_state هر ثانیه) در INFO لاگ نمی‌شود
+logging.getLogger("apscheduler").setLevel(logging.WARNING)
 logger = logging.getLogger(__name__)
+# زمان شروع بارگذاری برنامه (برای boot_ms در /ready)
+_boot_started = time.perf_counter()
+
+
+class PriceJSONProvider(DefaultJSONProvider):
+    """jsonify ردیف‌های SilverPrice را هم می‌شناسد"""
+
+    @staticmethod
+    def default(o):
+        if isinstance(o, SilverPrice):
+            return o.to_dict()
+        return DefaultJSONProvider.default(o)
+
 
 app = Flask(__name__)
+app.json = PriceJSONProvider(app)
 app.secret_key = os.environ.get("SECRET_KEY", "change-this-in-production-12345")
 
+# تعداد proxy های جلوی برنامه (مثلاً 1 روی Render)؛ IP کلاینت از X-Forwarded-For
+TRUSTED_PROXIES = int(os.environ.get("TRUSTED_PROXIES", 0))
+if TRUSTED_PROXIES:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=TRUSTED_PROXIES)
+
 # مسیر فایل برای ذخیره داده‌ها
 DATA_FILE = "data_store.json"
+data_file = JsonStore(DATA_FILE, default=json_default)
 
 data_store = {
     "prices": [],
     "last_update": None,
     "increase_percentage": 0.0,
+    # درصد وارد شده در /setup؛ فقط بعد از ورود موفق در /verify اعمال می‌شود
+    "pending_increase_percentage": None,
+    "pricing_rules": [],
     "mobile_number": None,
     "is_configured": False,
     "is_updating": False,
     "sms_requested": False,
     "token": None,
+    "token_obtained_at": None,
+    "token_rejected": False,
+    "fetched_at": None,
+    "source": None,
 }
 
-api_scraper = ShirazSilverAPI()
-update_lock = threading.Lock()
+api_scraper = AsyncShirazSilverAPI()
+upstream = UpstreamLoop()
+# همه درخواست‌های همزمان بروزرسانی به یک فراخوانی upstream ختم می‌شوند
+update_flight = SingleFlight()
+
+# اسنپ‌شات مشترک بین worker های gunicorn؛ فقط رهبر scheduler را اجرا می‌کند
+shared = shared_state_from_env()
+is_leader = False
+# آخرین درخواست بروزرسانی worker های دیگر که رهبر اجرا کرده (درخواست‌های قبل از شروع نادیده)
+served_update_request = time.time()
+served_update_lock = threading.Lock()
+# فیلدهایی از data_store که بین worker ها همگام می‌شوند
+SHARED_FIELDS = (
+    "prices", "last_update", "fetched_at", "source", "increase_percentage", "pricing_rules",
+    "mobile_number", "is_configured", "sms_requested", "pending_increase_percentage",
+    "token", "token_obtained_at", "token_rejected",
+)
+# فیلدهایی که فقط با دریافت قیمت از upstream عوض می‌شوند
+PRICE_FIELDS = ("prices", "last_update", "fetched_at", "source")
+PRICING_FIELDS = ("increase_percentage", "pricing_rules")
+# زیر publish.lock فقط خواندن و نوشتن فایل مشترک انجام می‌شود
+PUBLISH_LOCK_TIMEOUT = 5
+
+# محافظ upstream: بعد از چند خطای پشت‌سرهم، درخواست‌ها موقتاً متوقف می‌شوند
+upstream_breaker = CircuitBreaker(
+    failure_threshold=int(os.environ.get("BREAKER_THRESHOLD", 3)),
+    reset_timeout=float(os.environ.get("BREAKER_RESET_SECONDS", 60)),
+)
+
+# قیمت‌ها قدیمی‌تر از این (ثانیه) یا بعد از بروزرسانی ناموفق stale حساب می‌شوند
+STALE_AFTER = int(os.environ.get("STALE_AFTER_SECONDS", 1200))
+# حداقل فاصله بین دو revalidate پس‌زمینه که /api/prices شروع می‌کند
+REVALIDATE_INTERVAL = 30
+# تعداد تلاش برای خطاهای گذرا (timeout، 429، 5xx)
+UPSTREAM_ATTEMPTS = 3
+last_fetch_failed = False
+last_revalidate = 0.0
+
+PRICES_STALENESS.set_function(
+    lambda: time.time() - data_store["fetched_at"] if data_store.get("fetched_at") else float("nan")
+)
+
+# کنترل پذیرش route هایی که به upstream درخواست می‌فرستند؛ برای هر گروه
+# (محدودیت هر کلاینت، محدودیت سراسری) با فرمت 'N/S': N درخواست در S ثانیه
+rate_limiter = RateLimiter(bucket_store_from_env(), {
+    "refresh": (
+        Limit.parse(os.environ.get("RATE_LIMIT_REFRESH", "3/60")),
+        Limit.parse(os.environ.get("RATE_LIMIT_REFRESH_GLOBAL", "20/60")),
+    ),
+    "setup": (
+        Limit.parse(os.environ.get("RATE_LIMIT_SETUP", "3/300")),
+        Limit.parse(os.environ.get("RATE_LIMIT_SETUP_GLOBAL", "20/300")),
+    ),
+    "verify": (
+        Limit.parse(os.environ.get("RATE_LIMIT_VERIFY", "10/300")),
+        Limit.parse(os.environ.get("RATE_LIMIT_VERIFY_GLOBAL", "60/300")),
+    ),
+})
+# تا این مدت (ثانیه) بعد از دریافت موفق، /api/refresh همان نتیجه را برمی‌گرداند
+REFRESH_COOLDOWN = int(os.environ.get("REFRESH_COOLDOWN_SECONDS", 30))
+RATE_LIMITED_MESSAGE = "درخواست‌ها بیش از حد مجاز است؛ {} ثانیه دیگر دوباره تلاش کنید"
+
+# اسنپ‌شات از پیش سریال‌شده برای /api/prices (فقط با هر بروزرسانی عوض می‌شود)
+prices_snapshot = None
+# تنظیمات قیمت‌گذاری‌ای که قیمت‌های فعلی data_store با آن محاسبه شده‌اند
+priced_with = None
+# نسخه stale همان اسنپ‌شات: (اسنپ‌شات پایه، نسخه stale)
+_stale_variant = (None, None)
+
+# کانال push برای /api/stream
+price_broker = PriceBroker()
+
+
+def _on_token_alert(status, info):
+    """اطلاع‌رسانی وضعیت توکن به داشبوردها"""
+    price_broker.publish("status", {
+        "is_configured": data_store["is_configured"],
+        "needs_login": status in (TokenManager.EXPIRED, TokenManager.REJECTED),
+        "token": info,
+    })
+
+
+# چرخه عمر توکن: هشدار قبل از انقضا و حالت degraded بعد از 401
+token_manager = TokenManager(
+    warn_before=int(os.environ.get("TOKEN_WARN_BEFORE_SECONDS", 24 * 3600)),
+    max_age=int(os.environ["TOKEN_MAX_AGE_SECONDS"]) if os.environ.get("TOKEN_MAX_AGE_SECONDS") else None,
+    on_alert=_on_token_alert,
+)
+
+# تاریخچه append-only قیمت‌ها و کندل‌ها؛ numpy لازم دارند و با اولین
+# استفاده (اولین بروزرسانی یا /api/history) ساخته می‌شوند
+_history = None
+_history_lock = threading.Lock()
+
+
+def history_store():
+    """(PriceHistory، CandleCache)"""
+    global _history
+    if _history is None:
+        with _history_lock:
+            if _history is None:
+                from history import PriceHistory
+                from candles import CandleCache
+                price_history = PriceHistory()
+                _history = (price_history, CandleCache(price_history))
+    return _history
+
+# فاصله تطبیقی بروزرسانی قیمت‌ها
+cadence = AdaptiveCadence.from_env()
 
 
 def get_persian_datetime():
@@ -44,138 +197,652 @@ def get_persian_datetime():
 
 
 def save_data_store():
-    """ذخیره data_store در فایل"""
-    try:
-        with open(DATA_FILE, "w", encoding="utf-8") as f:
-            json.dump({
-                "prices": data_store["prices"],
-                "last_update": data_store["last_update"],
-                "increase_percentage": data_store["increase_percentage"],
-                "mobile_number": data_store["mobile_number"],
-                "is_configured": data_store["is_configured"],
-                "token": data_store["token"],
-            }, f, ensure_ascii=False, indent=2)
-        logger.info("Data saved to file")
-    except Exception as e:
-        logger.error(f"Error saving data: {e}")
+    """ذخیره data_store در فایل (اتمیک و در پس‌زمینه)"""
+    data_file.save({
+        "prices": data_store["prices"],
+        "last_update": data_store["last_update"],
+        "increase_percentage": data_store["increase_percentage"],
+        "pricing_rules": data_store["pricing_rules"],
+        "mobile_number": data_store["mobile_number"],
+        "is_configured": data_store["is_configured"],
+        "token": data_store["token"],
+        "token_obtained_at": data_store["token_obtained_at"],
+        "token_rejected": data_store["token_rejected"],
+        "fetched_at": data_store["fetched_at"],
+        "source": data_store["source"],
+    })
 
 
 def load_data_store():
     """بارگذاری data_store از فایل"""
     global data_store
     try:
-        if os.path.exists(DATA_FILE):
-            with open(DATA_FILE, "r", encoding="utf-8") as f:
-                loaded = json.load(f)
-                data_store.update(loaded)
-                
-                # بازیابی token در api_scraper
-                if data_store.get("token"):
-                    api_scraper.token = data_store["token"]
-                    api_scraper.session.headers["Authorization"] = f"Bearer {data_store['token']}"
-                    api_scraper.is_logged_in = True
-                    logger.info("Token restored from file")
+        loaded = data_file.load()
+        if loaded:
+            data_store.update(loaded)
+            data_store["prices"] = [SilverPrice.from_dict(p) for p in data_store["prices"]]
+            
+            # بازیابی token در api_scraper
+            if data_store.get("token"):
+                api_scraper.set_token(data_store["token"])
+                token_manager.set(
+                    data_store["token"],
+                    obtained_at=data_store.get("token_obtained_at"),
+                    rejected=data_store.get("token_rejected", False),
+                )
+                logger.info("Token restored from file (%s)", token_manager.status())
     except Exception as e:
         logger.error(f"Error loading data: {e}")
 
 
-def apply_increase(base, percent):
+def _snapshot_payload(stale=False):
+    return {
+        "success": True,
+        "prices": data_store["prices"],
+        "last_update": data_store["last_update"],
+        "increase_percentage": data_store["increase_percentage"],
+        "is_configured": data_store["is_configured"],
+        "stale": stale,
+        "fetched_at": data_store["fetched_at"],
+        "source": data_store["source"],
+    }
+
+
+def _pricing_key():
+    return tuple(data_store[key] for key in PRICING_FIELDS)
+
+
+def _build_snapshot():
+    global prices_snapshot
+    # قیمت‌ها با تنظیمات قبلی محاسبه شده‌اند (تغییر تنظیمات، یا قیمت رهبر قبل از رسیدن آن)
+    if _pricing_key() != priced_with:
+        reprice()
+    previous = prices_snapshot
+    prices_snapshot = build_snapshot(_snapshot_payload(), previous=previous)
+    if prices_snapshot is not previous:
+        CACHE_MISSES.inc(cache="prices_snapshot")
+        invalidate_pages()
+    return prices_snapshot
+
+
+def publish_snapshot(share=True, changed=()):
+    """
+    ساخت اسنپ‌شات جدید از data_store برای سرو در /api/prices و انتشار برای بقیه worker ها
+
+    changed فیلدهایی است که همین worker عوض کرده؛ بقیه فیلدها زیر publish.lock
+    اول از آخرین state مشترک خوانده می‌شوند تا مثلاً قیمت‌های تازه رهبر با
+    نسخه قدیمی worker دیگر بازنویسی نشوند.
+    """
+    if not share:
+        return _build_snapshot()
     try:
-        return int(base * (1 + float(percent) / 100))
-    except Exception:
-        return base
+        with shared.publish_lock(timeout=PUBLISH_LOCK_TIMEOUT):
+            sync_shared_state(force=True, keep=changed)
+            snap = _build_snapshot()
+            state = {key: data_store[key] for key in SHARED_FIELDS}
+            state["fetch_failed"] = last_fetch_failed
+            shared.publish(snap, state)
+            return snap
+    except Exception as e:
+        logger.error(f"Error publishing shared snapshot: {e}")
+        return _build_snapshot()
 
 
-def update_prices_job():
-    """دریافت قیمت‌ها و اعمال درصد افزایش"""
-    global data_store
-    with update_lock:
-        if data_store["is_updating"]:
-            logger.info("update already running")
-            return
-        data_store["is_updating"] = True
+def sync_shared_state(force=False, keep=()):
+    """
+    دریافت اسنپ‌شات worker دیگر (اگر عوض شده باشد)
 
+    اسنپ‌شات بدون ساخت دوباره سرو می‌شود و ردیف‌های تغییرکرده به کلاینت‌های
+    SSE همین worker فرستاده می‌شوند. فیلدهای keep (تغییرات منتشرنشده همین
+    worker) از state مشترک خوانده نمی‌شوند.
+    """
+    global prices_snapshot, last_fetch_failed, priced_with
     try:
-        logger.info("start update_prices_job")
-        res = api_scraper.get_silver_prices()
-        
-        # چک کردن خطای 401
-        if not res["success"] and "401" in res.get("message", ""):
-            logger.warning("Token expired (401), need re-login")
-            data_store["is_configured"] = False
-            data_store["token"] = None
-            save_data_store()
-            return
+        loaded = shared.poll(force=force)
+    except Exception as e:
+        logger.error(f"Error reading shared snapshot: {e}")
+        return False
+    if loaded is None:
+        return False
+    snap, raw = loaded
+    state = {key: raw[key] for key in SHARED_FIELDS if key in raw and key not in keep}
 
-        if not res["success"]:
-            logger.warning("update error: %s", res["message"])
-            return
-
-        inc = float(data_store.get("increase_percentage", 0) or 0)
-        new_list = []
-        for p in res["prices"]:
-            bp_base = p["buy_price_base"]
-            sp_base = p["sell_price_base"]
-            p["buy_price"] = apply_increase(bp_base, inc)
-            p["sell_price"] = apply_increase(sp_base, inc)
-            p["increase_percentage"] = inc
-            new_list.append(p)
-
-        data_store["prices"] = new_list
-        data_store["last_update"] = get_persian_datetime()
-        save_data_store()
-        logger.info("prices updated: %d items at %s", len(new_list), data_store["last_update"])
+    changed = []
+    if "prices" in state:
+        # ردیف‌های تغییرنکرده همان اشیاء قبلی (با JSON کش‌شده) می‌مانند
+        state["prices"] = reuse_unchanged(
+            data_store["prices"], [SilverPrice.from_dict(p) for p in state["prices"]],
+        )
+        changed = changed_rows(data_store["prices"], state["prices"])
+        priced_with = tuple(raw.get(key) for key in PRICING_FIELDS)
+    pricing_changed = any(
+        key in state and state[key] != data_store[key] for key in PRICING_FIELDS
+    )
+    token_changed = any(
+        key in state and state[key] != data_store[key] for key in ("token", "token_rejected")
+    )
+    data_store.update(state)
+    if "fetch_failed" not in keep:
+        last_fetch_failed = raw.get("fetch_failed", False)
+    prices_snapshot = snap
+    invalidate_pages()
+
+    if pricing_changed:
+        compile_pricing()
+    if token_changed:
+        api_scraper.set_token(data_store["token"])
+        token_manager.set(
+            data_store["token"],
+            obtained_at=data_store["token_obtained_at"],
+            rejected=data_store["token_rejected"],
+        )
+    if changed:
+        price_broker.publish("prices", {
+            "prices": changed,
+            "last_update": data_store["last_update"],
+        })
+    return True
+
+
+def stale_snapshot(snap):
+    """نسخه stale: true اسنپ‌شات (یک بار برای هر اسنپ‌شات ساخته می‌شود)"""
+    global _stale_variant
+    base, variant = _stale_variant
+    if base is not snap:
+        variant = build_snapshot(_snapshot_payload(stale=True))
+        _stale_variant = (snap, variant)
+    return variant
+
+
+# صفحه‌های رندرشده برای اسنپ‌شات فعلی: {(template, etag, token_status): PriceSnapshot}
+_page_cache = {}
+
+
+def invalidate_pages():
+    """پاک کردن صفحه‌های رندرشده؛ با هر اسنپ‌شات جدید صدا زده می‌شود"""
+    _page_cache.clear()
+
+
+def render_cached(template):
+    """
+    سرو قالب رندرشده از کش (همراه با gzip و ETag)
+
+    هر قالب فقط یک بار برای هر اسنپ‌شات و وضعیت توکن رندر می‌شود.
+    """
+    snap = prices_snapshot or publish_snapshot()
+    token_status = token_manager.status()
+    key = (template, snap.etag, token_status)
+    page = _page_cache.get(key)
+    if page is None:
+        CACHE_MISSES.inc(cache="pages")
+        html = render_template(
+            template,
+            prices=data_store["prices"],
+            last_update=data_store["last_update"],
+            is_configured=data_store["is_configured"],
+            token_status=token_status,
+        )
+        page = PriceSnapshot(html.encode("utf-8"))
+        _page_cache[key] = page
+    else:
+        CACHE_HITS.inc(cache="pages")
+    return snapshot_response(page, request, mimetype="text/html")
+
+
+def prices_are_stale():
+    """آیا قیمت‌های فعلی قدیمی هستند؟ (بروزرسانی آخر ناموفق یا عمر زیاد)"""
+    fetched_at = data_store.get("fetched_at")
+    if not fetched_at:
+        return True
+    if last_fetch_failed or upstream_breaker.state != CircuitBreaker.CLOSED:
+        return True
+    return time.time() - fetched_at > max(STALE_AFTER, 2 * cadence.current)
+
+
+def revalidate_in_background():
+    """شروع بروزرسانی در پس‌زمینه برای درخواستی که داده stale گرفته"""
+    global last_revalidate
+    now = time.monotonic()
+    if now - last_revalidate < REVALIDATE_INTERVAL or update_flight.in_flight():
+        return
+    if upstream_breaker.state == CircuitBreaker.OPEN or not token_manager.usable():
+        return
+    last_revalidate = now
+    if not is_leader:
+        ask_leader_update()
+        return
+    threading.Thread(target=update_prices_job, name="revalidate", daemon=True).start()
+
+
+def call_upstream(coro, attempts=1, timeout=None):
+    """اجرای یک فراخوانی AsyncShirazSilverAPI روی loop پس‌زمینه و انتظار برای نتیجه"""
+    if timeout is None:
+        timeout = attempts * (CONNECT_TIMEOUT + READ_TIMEOUT + 5)
+    try:
+        return upstream.run(coro, timeout=timeout)
+    except Exception as e:
+        logger.warning("upstream call failed: %r", e)
+        return {"success": False, "transient": True, "prices": [], "message": str(e) or "timeout"}
+
+
+# منابع قیمت: API و اگر PRICE_FALLBACK=scraper باشد، مرورگر headless به‌عنوان جایگزین
+SCRAPER_TIMEOUT = 60
+price_source = FailoverSource(
+    ApiSource(
+        api_scraper,
+        breaker=upstream_breaker,
+        attempts=UPSTREAM_ATTEMPTS,
+        ready=token_manager.usable,
+        on_request=cadence.note_request,
+    ),
+    ScraperSource(known_ids=lambda: {p["name"]: p["id"] for p in data_store["prices"]})
+    if os.environ.get("PRICE_FALLBACK") == "scraper" else None,
+    # اگر API تا این چند ثانیه جواب ندهد، scraper همزمان شروع می‌شود
+    hedge_after=float(os.environ["PRICE_HEDGE_SECONDS"]) if os.environ.get("PRICE_HEDGE_SECONDS") else None,
+)
+FETCH_TIMEOUT = UPSTREAM_ATTEMPTS * (CONNECT_TIMEOUT + READ_TIMEOUT + 5) + (
+    SCRAPER_TIMEOUT if price_source.fallback else 0
+)
+
+
+# قوانین قیمت‌گذاری؛ increase_percentage لایه پایه همه قوانین است
+pricing = PricingRules()
+
+
+def compile_pricing():
+    """کامپایل دوباره قوانین بعد از تغییر قوانین یا درصد افزایش"""
+    pricing.compile(data_store.get("pricing_rules"), data_store.get("increase_percentage"))
+
+
+def load_pricing():
+    """کامپایل تنظیمات ذخیره‌شده در شروع؛ مقدار نامعتبر جلوی بالا آمدن برنامه را نمی‌گیرد"""
+    global priced_with
+    priced_with = _pricing_key()
+    try:
+        data_store["increase_percentage"] = parse_percent(data_store.get("increase_percentage"))
+    except RuleError as e:
+        logger.error("invalid stored increase_percentage, using 0: %s", e)
+        data_store["increase_percentage"] = 0.0
+    try:
+        compile_pricing()
+    except RuleError as e:
+        logger.error("invalid stored pricing rules, ignoring them: %s", e)
+        data_store["pricing_rules"] = []
+        compile_pricing()
+
+
+def apply_markup(prices, category=None):
+    """اعمال درصد افزایش و قوانین قیمت‌گذاری روی قیمت‌های پایه"""
+    return pricing.apply(prices, category)
+
+
+def reprice():
+    """محاسبه دوباره قیمت‌ها با تنظیمات فعلی از قیمت‌های پایه ذخیره‌شده، بدون درخواست به upstream"""
+    global priced_with
+    priced_with = _pricing_key()
+    if not data_store["prices"]:
+        return
+    new_list = apply_markup(data_store["prices"])
+    changed = changed_rows(data_store["prices"], new_list)
+    data_store["prices"] = new_list
+    if changed:
+        price_broker.publish("prices", {
+            "prices": changed,
+            "last_update": data_store["last_update"],
+        })
+
+
+# قوانین هشدار تغییر قیمت و webhook ها (alerts.json)
+alert_webhooks, alert_rules = load_alerts()
+alert_dispatcher = AlertDispatcher(alert_webhooks)
+
+
+# حساب‌های اضافی (accounts.json) که همزمان بروزرسانی می‌شوند
+fetch_engine = FetchEngine(
+    load_accounts(),
+    max_workers=int(os.environ.get("FETCH_WORKERS", 4)),
+    transform=apply_markup,
+)
+
+
+def update_accounts_job():
+    """بروزرسانی همزمان قیمت همه حساب‌های اضافی"""
+    try:
+        upstream.run(fetch_engine.refresh_all(), timeout=CONNECT_TIMEOUT + READ_TIMEOUT + 5)
+        # worker های دیگر جدول‌ها را از فایل مشترک سرو می‌کنند
+        shared.write_json("accounts", fetch_engine.tables)
+        logger.info("accounts updated: %s", ", ".join(fetch_engine.tables) or "-")
+    except Exception as e:
+        logger.error(f"Error in accounts update: {e}", exc_info=True)
+
+
+def update_prices_job(timeout=None):
+    """
+    دریافت قیمت‌ها و اعمال درصد افزایش
+
+    اگر بروزرسانی دیگری در جریان باشد، به همان متصل می‌شود و نتیجه آن را
+    برمی‌گرداند. با timeout، در صورت تمام شدن زمان TimeoutError می‌دهد.
+    """
+    if update_flight.in_flight():
+        logger.info("update already running, waiting for its result", extra={"event": "update_waiting"})
+    return update_flight.do(_update_prices, timeout=timeout)
+
+
+def ask_leader_update():
+    """ثبت درخواست بروزرسانی برای رهبر؛ فقط رهبر به upstream درخواست می‌دهد"""
+    requested_at = time.time()
+    shared.write_json("update_request", {"at": requested_at})
+    return requested_at
+
+
+def refresh_prices(timeout=None):
+    """
+    بروزرسانی فوری از هر worker
+
+    روی رهبر همان update_prices_job است؛ بقیه worker ها از رهبر می‌خواهند و تا
+    timeout منتظر نتیجه او در فایل مشترک می‌مانند (وگرنه TimeoutError).
+    """
+    if is_leader:
+        return update_prices_job(timeout=timeout)
+    requested_at = ask_leader_update()
+    deadline = time.monotonic() + (FETCH_TIMEOUT if timeout is None else timeout)
+    while time.monotonic() < deadline:
+        time.sleep(0.25)
+        result = shared.read_json("update_result")
+        if result and result.get("at", 0) >= requested_at:
+            sync_shared_state(force=True)
+            return result["result"]
+    raise TimeoutError("leader update timed out")
+
+
+def serve_update_request():
+    """اجرای درخواست بروزرسانی worker های دیگر در پس‌زمینه (فقط روی رهبر)"""
+    global served_update_request
+    req = shared.read_json("update_request")
+    if not req or req.get("at", 0) <= served_update_request:
+        return
+    served_update_request = req["at"]
+    threading.Thread(target=_serve_update, args=(req["at"],), name="leader-update", daemon=True).start()
+
+
+def _serve_update(requested_at):
+    try:
+        res = update_prices_job()
+    except Exception as e:
+        res = {"success": False, "message": str(e)}
+    with served_update_lock:
+        # نتیجه درخواست جدیدتری که زودتر تمام شده بازنویسی نمی‌شود
+        previous = shared.read_json("update_result")
+        if previous is None or previous.get("at", 0) < requested_at:
+            shared.write_json("update_result", {"at": requested_at, "result": res})
+
+
+def _update_prices():
+    with UPDATE_DURATION.time():
+        res = _fetch_and_publish()
+    if res["success"]:
+        UPDATE_RESULTS.inc(result="success")
+    elif res["message"] in ("need_login", "budget_exhausted", "circuit_open"):
+        UPDATE_RESULTS.inc(result=res["message"])
+    else:
+        UPDATE_RESULTS.inc(result="error")
+    return res
+
+
+def _fetch_and_publish():
+    data_store["is_updating"] = True
+
+    # None یعنی نتیجه‌ای برای تنظیم فاصله بعدی نداریم
+    outcome = None
+    try:
+        if cadence.budget_exhausted():
+            logger.warning("upstream hourly budget exhausted, skipping update")
+            return {"success": False, "message": "budget_exhausted"}
+
+        # در هر لحظه فقط یک worker به upstream درخواست می‌دهد؛ اگر worker دیگری
+        # در همین فاصله قیمت گرفته باشد، نتیجه او استفاده می‌شود
+        fetched_at = data_store["fetched_at"]
+        with shared.fetch_lock(timeout=FETCH_TIMEOUT):
+            sync_shared_state(force=True)
+            if data_store["fetched_at"] != fetched_at:
+                logger.info("prices fetched by another worker")
+                return {
+                    "success": True,
+                    "message": "updated",
+                    "last_update": data_store["last_update"],
+                    "changed": 0,
+                }
+            res = _fetch_upstream()
+            if res["success"]:
+                outcome = res["changed"] > 0
+            return res
     except Exception as e:
         logger.error(f"Error in update: {e}", exc_info=True)
+        return {"success": False, "message": str(e)}
     finally:
         data_store["is_updating"] = False
+        reschedule_updates(outcome)
+
+
+def _fetch_upstream():
+    global last_fetch_failed, priced_with
+    logger.info("start update_prices_job")
+    was_failed = last_fetch_failed
+    res = call_upstream(price_source.fetch(), timeout=FETCH_TIMEOUT)
+    last_fetch_failed = not res["success"]
+
+    # توکن رد شد (401): اگر منبع جایگزین هم قیمت نداد، قیمت‌های قبلی به‌صورت
+    # stale سرو می‌شوند تا ورود مجدد
+    changed_fields = ("fetch_failed",)
+    if res.get("status") == 401 or res.get("primary", {}).get("status") == 401:
+        logger.warning("Token rejected (401)")
+        data_store["token_rejected"] = True
+        token_manager.reject()
+        changed_fields += ("token_rejected",)
+        if not res["success"]:
+            publish_snapshot(changed=changed_fields)
+            save_data_store()
+            return {"success": False, "message": "need_login"}
+
+    if not res["success"]:
+        logger.warning("update error: %s", res["message"])
+        # بقیه worker ها هم قیمت‌ها را stale سرو کنند
+        if not was_failed:
+            publish_snapshot(changed=changed_fields)
+        return {"success": False, "message": res["message"]}
+
+    previous = data_store["prices"]
+    data_store["prices"] = reuse_unchanged(previous, apply_markup(res["prices"]))
+    priced_with = _pricing_key()
+    data_store["last_update"] = get_persian_datetime()
+    data_store["fetched_at"] = time.time()
+    data_store["source"] = res["source"]
+    # اگر تنظیمات قیمت‌گذاری در این فاصله روی worker دیگری عوض شده باشد،
+    # قیمت‌ها هنگام انتشار با تنظیمات جدید دوباره محاسبه می‌شوند
+    publish_snapshot(changed=PRICE_FIELDS + changed_fields)
+    save_data_store()
+    new_list = data_store["prices"]
+    changed = changed_rows(previous, new_list)
+    alerts = evaluate_alerts(alert_rules, previous, new_list)
+    history_store()[0].append(new_list)
+    # ارسال هشدارها در پس‌زمینه؛ بروزرسانی منتظر webhook ها نمی‌ماند
+    if alerts:
+        logger.info("%d price alerts queued", len(alerts))
+        alert_dispatcher.submit(alerts)
+    price_broker.publish("prices", {
+        "prices": changed,
+        "last_update": data_store["last_update"],
+    })
+    logger.info("prices updated from %s: %d items at %s",
+                res["source"], len(new_list), data_store["last_update"])
+    return {
+        "success": True,
+        "message": "updated",
+        "last_update": data_store["last_update"],
+        "changed": len(changed),
+    }
+
+
+def reschedule_updates(changed):
+    """تنظیم زمان اجرای بعدی بر اساس تغییر قیمت‌ها، ساعات بازار و بودجه upstream"""
+    if not is_leader:
+        return
+    seconds = cadence.next_interval(changed)
+    try:
+        scheduler.reschedule_job("update_prices", trigger="interval", seconds=seconds)
+    except Exception as e:
+        logger.warning("reschedule failed: %s", e)
+        return
+    logger.info("next update in %ss", seconds)
+
+
+def become_leader():
+    """اضافه کردن job های upstream به scheduler این worker (فقط روی رهبر)"""
+    global is_leader
+    is_leader = True
+    logger.info("worker %s is the update leader", os.getpid())
+    scheduler.add_job(update_prices_job, "interval", seconds=cadence.base_interval, id="update_prices")
+    scheduler.add_job(token_manager.check, "interval", minutes=10, id="check_token")
+    if fetch_engine.accounts:
+        scheduler.add_job(update_accounts_job, "interval", minutes=10, id="update_accounts",
+                          next_run_time=datetime.now())
+
+
+def follow_shared_state():
+    """همگام‌سازی دوره‌ای با اسنپ‌شات مشترک؛ اگر رهبر از دست رفته باشد رهبری گرفته می‌شود"""
+    sync_shared_state(force=True)
+    if not is_leader and shared.try_lead():
+        become_leader()
+    if is_leader:
+        serve_update_request()
+
+
+def publish_metrics():
+    """انتشار متریک‌های این worker تا /metrics هر worker مجموع همه را برگرداند"""
+    try:
+        shared.publish_metrics(REGISTRY.dump())
+    except Exception as e:
+        logger.warning("publishing metrics failed: %s", e)
+
+
+# وضعیت اولین بروزرسانی این worker برای /ready:
+# pending، running، done، failed یا skipped (رهبر نیست یا لاگین نشده)
+warmup = {"state": "pending", "message": None, "seconds": None}
+
+
+def warm_up():
+    """اولین بروزرسانی بعد از شروع، بیرون از مسیر بوت worker"""
+    warmup["state"] = "running"
+    started = time.perf_counter()
+    try:
+        res = update_prices_job()
+    except Exception as e:
+        res = {"success": False, "message": str(e)}
+    warmup.update(
+        state="done" if res["success"] else "failed",
+        message=res["message"],
+        seconds=round(time.perf_counter() - started, 3),
+    )
+    logger.info("warm-up %s in %.1fs: %s", warmup["state"], warmup["seconds"], res["message"])
 
 
 # بارگذاری داده‌ها در شروع
 load_data_store()
+load_pricing()
+alert_dispatcher.start(upstream)
 
-# Scheduler با interval 10 دقیقه
+# Scheduler؛ فاصله بعد از هر اجرا توسط cadence تنظیم می‌شود
 scheduler = BackgroundScheduler(daemon=True)
-scheduler.add_job(update_prices_job, "interval", minutes=10, id="update_prices")
+scheduler.add_job(follow_shared_state, "interval", seconds=1, id="follow_shared_state")
+scheduler.add_job(publish_metrics, "interval", seconds=5, id="publish_metrics")
+if shared.try_lead():
+    publish_snapshot()
+    become_leader()
+elif not sync_shared_state(force=True):
+    publish_snapshot(share=False)
 scheduler.start()
 
-# اولین بروزرسانی در شروع (اگر لاگین است)
-if data_store.get("is_configured") and data_store.get("token"):
-    update_prices_job()
+# اولین بروزرسانی در پس‌زمینه؛ تا آن موقع از اسنپ‌شات ذخیره‌شده سرو می‌شود
+if is_leader and data_store.get("is_configured") and token_manager.usable():
+    threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
+else:
+    warmup["state"] = "skipped"
+boot_seconds = time.perf_counter() - _boot_started
+logger.info("worker %s started in %.0f ms", os.getpid(), boot_seconds * 1000)
+
+
+@app.before_request
+def _start_timer():
+    g.request_started = time.perf_counter()
+
+
+@app.after_request
+def _record_request(response):
+    started = g.pop("request_started", None)
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        HTTP_LATENCY.observe(time.perf_counter() - started, route=route, method=request.method)
+        if response.status_code == 304:
+            HTTP_NOT_MODIFIED.inc(route=route)
+    return response
 
 
 @app.route("/")
 def index():
-    # چک کردن اگر token منقضی شده باشد
-    if data_store.get("is_configured") and not data_store.get("token"):
-        return redirect(url_for("setup"))
-    
-    return render_template(
-        "index.html",
-        prices=data_store["prices"],
-        last_update=data_store["last_update"],
-        is_configured=data_store["is_configured"],
-    )
+    sync_shared_state()
+    # با توکن منقضی، قیمت‌های کش‌شده همراه با پیام ورود مجدد نمایش داده می‌شوند
+    return render_cached("index.html")
+
+
+@app.route("/fragments/prices")
+def prices_fragment():
+    """جدول قیمت‌ها به‌صورت HTML برای جایگزینی در صفحه"""
+    sync_shared_state()
+    return render_cached("_prices.html")
+
+
+def admit(group):
+    """بررسی rate limit درخواست جاری؛ 0 یعنی پذیرفته شد، وگرنه ثانیه تا تلاش بعدی"""
+    client = request.remote_addr or "-"
+    scope, retry_after = rate_limiter.check(group, client)
+    if scope is None:
+        return 0
+    RATE_LIMITED.inc(group=group, scope=scope)
+    logger.warning("rate limited %s (%s) for %s, retry in %ss", group, scope, client, retry_after,
+                   extra={"event": "rate_limited", "group": group, "scope": scope})
+    return retry_after
 
 
 @app.route("/setup", methods=["GET", "POST"])
 def setup():
     if request.method == "POST":
+        retry_after = admit("setup")
+        if retry_after:
+            return render_template(
+                "setup.html",
+                error=RATE_LIMITED_MESSAGE.format(retry_after),
+                increase_percentage=data_store["increase_percentage"],
+            ), 429, {"Retry-After": str(retry_after)}
+
+        sync_shared_state(force=True)
         mobile = request.form.get("mobile")
         inc_str = (request.form.get("increase_percentage") or "0").replace(",", "")
         try:
-            inc = float(inc_str)
-        except Exception:
-            inc = 0.0
+            inc = parse_percent(inc_str)
+        except RuleError as e:
+            return render_template("setup.html", error=str(e), increase_percentage=inc_str), 400
 
+        # هر بازدیدکننده‌ای به /setup دسترسی دارد؛ قیمت‌ها تا ورود موفق عوض نمی‌شوند
         data_store["mobile_number"] = mobile
-        data_store["increase_percentage"] = inc
+        data_store["pending_increase_percentage"] = inc
 
-        logger.info("send_otp to %s with increase %s%%", mobile, inc)
+        logger.info("send_otp to %s with pending increase %s%%", mobile, inc)
 
-        res = api_scraper.send_otp(mobile)
+        res = call_upstream(api_scraper.send_otp(mobile))
         if res["success"]:
             data_store["sms_requested"] = True
+            # /verify ممکن است روی worker دیگری اجرا شود
+            publish_snapshot(changed=("mobile_number", "pending_increase_percentage", "sms_requested"))
             return redirect(url_for("verify"))
         return render_template(
             "setup.html", error=res["message"], increase_percentage=inc
@@ -189,19 +856,45 @@ def setup():
 @app.route("/verify", methods=["GET", "POST"])
 def verify():
     if request.method == "POST":
+        retry_after = admit("verify")
+        if retry_after:
+            return render_template(
+                "verify.html",
+                mobile=data_store.get("mobile_number"),
+                error=RATE_LIMITED_MESSAGE.format(retry_after),
+                sms_sent=data_store.get("sms_requested", False),
+            ), 429, {"Retry-After": str(retry_after)}
+
+        sync_shared_state(force=True)
         code = request.form.get("code")
         mobile = data_store.get("mobile_number")
         if not mobile:
             return redirect(url_for("setup"))
 
-        logger.info("verify code %s for %s", code, mobile)
-        res = api_scraper.verify_otp(mobile, code)
+        # خود کد هیچ‌وقت لاگ نمی‌شود
+        logger.info("verify code for %s", mobile, extra={"event": "verify_otp"})
+        res = call_upstream(api_scraper.verify_otp(mobile, code))
         
         if res["success"]:
             data_store["is_configured"] = True
             data_store["token"] = api_scraper.token
+            token_manager.set(api_scraper.token)
+            data_store["token_obtained_at"] = token_manager.obtained_at
+            data_store["token_rejected"] = False
+            changed = ("is_configured", "token", "token_obtained_at", "token_rejected")
+            pending = data_store["pending_increase_percentage"]
+            if pending is not None:
+                data_store["increase_percentage"] = pending
+                data_store["pending_increase_percentage"] = None
+                compile_pricing()
+                changed += ("increase_percentage", "pending_increase_percentage")
+            # قیمت‌ها هنگام انتشار با درصد جدید دوباره محاسبه می‌شوند
+            publish_snapshot(changed=changed)
             save_data_store()
-            update_prices_job()
+            try:
+                refresh_prices()
+            except TimeoutError:
+                logger.warning("first update after login did not finish in time")
             return redirect(url_for("index"))
         
         return render_template(
@@ -221,30 +914,165 @@ def verify():
 
 @app.route("/api/prices")
 def api_prices():
-    """API برای دریافت قیمت‌ها (برای AJAX polling)"""
+    """API برای دریافت قیمت‌ها (برای AJAX polling) از اسنپ‌شات آماده"""
+    sync_shared_state()
+    snap = prices_snapshot or publish_snapshot()
+    CACHE_HITS.inc(cache="prices_snapshot")
+
+    # در زمان قطعی upstream آخرین اسنپ‌شات سالم با stale: true سرو می‌شود
+    if data_store["prices"] and prices_are_stale():
+        snap = stale_snapshot(snap)
+        revalidate_in_background()
+
+    resp = snapshot_response(snap, request)
+    if data_store.get("fetched_at"):
+        resp.headers["Age"] = str(max(0, int(time.time() - data_store["fetched_at"])))
+    return resp
+
+
+@app.route("/api/stream")
+def api_stream():
+    """کانال Server-Sent Events برای push تغییرات قیمت"""
+    stream = price_broker.listen(request.headers.get("Last-Event-ID"))
+    return Response(stream, mimetype="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+    })
+
+
+def account_tables():
+    """جدول‌های حساب‌ها؛ فقط رهبر آن‌ها را می‌گیرد و بقیه از فایل مشترک می‌خوانند"""
+    if is_leader:
+        return fetch_engine.tables
+    return shared.read_json("accounts") or {}
+
+
+@app.route("/api/accounts")
+def api_accounts():
+    """وضعیت جدول قیمت حساب‌های اضافی"""
+    return jsonify({"success": True, "accounts": fetch_engine.summary(account_tables())})
+
+
+@app.route("/api/accounts/<key>/prices")
+def api_account_prices(key):
+    """قیمت‌های یک حساب (یا حساب:دسته)"""
+    table = account_tables().get(key)
+    if table is None:
+        return jsonify({"success": False, "message": "not_found"}), 404
+    return jsonify({
+        "success": True,
+        "prices": table["prices"],
+        "updated_at": table["updated_at"],
+    })
+
+
+@app.route("/api/history/<int:silver_id>")
+def api_history(silver_id):
+    """کندل‌های OHLC قیمت خرید و فروش؛ پارامترها: bucket, start, end (epoch ثانیه)"""
+    from candles import BUCKETS, candles_to_json
+
+    bucket = request.args.get("bucket", "10m")
+    width = BUCKETS.get(bucket)
+    if width is None:
+        return jsonify({"success": False, "message": f"bucket must be one of {', '.join(BUCKETS)}"}), 400
+    try:
+        end = float(request.args.get("end") or time.time())
+        start = float(request.args.get("start") or end - width * 500)
+    except ValueError:
+        return jsonify({"success": False, "message": "invalid start/end"}), 400
+
+    candles = history_store()[1].candles(silver_id, width, start=start, end=end)
+    def markup(buy_col, sell_col):
+        # پارامترهای یک id روی کل ستون broadcast می‌شوند
+        return pricing.apply_arrays((silver_id,), buy_col, sell_col)
+
+    return jsonify({
+        "success": True,
+        "id": silver_id,
+        "bucket": bucket,
+        "candles": candles_to_json(candles, markup),
+    })
+
+
+def _admin_allowed():
+    """تغییر تنظیمات فقط با هدر X-Admin-Token برابر ADMIN_TOKEN مجاز است"""
+    expected = os.environ.get("ADMIN_TOKEN")
+    return bool(expected) and request.headers.get("X-Admin-Token") == expected
+
+
+@app.route("/api/pricing-rules", methods=["GET", "PUT"])
+def api_pricing_rules():
+    """مشاهده یا جایگزینی قوانین قیمت‌گذاری؛ بعد از تغییر قیمت‌ها فوراً بازمحاسبه می‌شوند"""
+    if request.method == "PUT":
+        if not _admin_allowed():
+            return jsonify({"success": False, "message": "forbidden"}), 403
+        sync_shared_state(force=True)
+        rules = request.get_json(silent=True)
+        if isinstance(rules, dict):
+            rules = rules.get("rules")
+        if not isinstance(rules, list):
+            return jsonify({"success": False, "message": "expected a list of rules"}), 400
+        try:
+            pricing.compile(rules, data_store.get("increase_percentage"))
+        except (RuleError, TypeError, ValueError) as e:
+            return jsonify({"success": False, "message": str(e)}), 400
+        data_store["pricing_rules"] = rules
+        publish_snapshot(changed=("pricing_rules",))
+        save_data_store()
+
     return jsonify({
         "success": True,
-        "prices": data_store["prices"],
-        "last_update": data_store["last_update"],
         "increase_percentage": data_store["increase_percentage"],
-        "is_configured": data_store["is_configured"],
+        "rules": data_store["pricing_rules"],
     })
 
 
 @app.route("/api/refresh")
 def api_refresh():
-    """بروزرسانی دستی"""
+    """
+    بروزرسانی دستی؛ منتظر نتیجه بروزرسانی در جریان (یا جدید) می‌ماند
+
+    در فاصله REFRESH_COOLDOWN بعد از دریافت موفق، همان نتیجه بدون درخواست به
+    upstream برمی‌گردد؛ بقیه درخواست‌ها از rate limit رد می‌شوند (429).
+    """
+    sync_shared_state()
+    age = time.time() - (data_store["fetched_at"] or 0)
+    if data_store.get("is_configured") and not last_fetch_failed and age < REFRESH_COOLDOWN:
+        return jsonify({
+            "success": True,
+            "message": "cached",
+            "last_update": data_store["last_update"],
+            "changed": 0,
+        })
+
+    retry_after = admit("refresh")
+    if retry_after:
+        return jsonify({
+            "success": False,
+            "message": "rate_limited",
+            "retry_after": retry_after,
+            "last_update": data_store["last_update"],
+        }), 429, {"Retry-After": str(retry_after)}
+
     try:
-        update_prices_job()
-        
-        # چک کردن اگر token منقضی شده
-        if not data_store.get("is_configured"):
-            return jsonify({"success": False, "message": "need_login", "redirect": "/setup"}), 401
-        
-        return jsonify({"success": True, "message": "started"})
+        wait = min(float(request.args.get("wait", 20)), 60)
+    except ValueError:
+        wait = 20
+    try:
+        res = refresh_prices(timeout=wait)
+    except TimeoutError:
+        return jsonify({"success": True, "message": "in_progress"}), 202
     except Exception as e:
         return jsonify({"success": False, "message": str(e)}), 500
 
+    # چک کردن اگر token منقضی شده
+    if not data_store.get("is_configured") or res.get("message") == "need_login":
+        return jsonify({"success": False, "message": "need_login", "redirect": "/setup"}), 401
+
+    if not res["success"]:
+        return jsonify(res), 502
+    return jsonify(res)
+
 
 @app.route("/health")
 def health():
@@ -253,9 +1081,48 @@ def health():
         "timestamp": datetime.now().isoformat(),
         "is_configured": data_store["is_configured"],
         "last_update": data_store["last_update"],
+        "refresh": refresh_state(),
+        "upstream": upstream_breaker.info(),
+        "token": token_manager.info(),
+        "stale": prices_are_stale(),
+        "source": data_store["source"],
+        "worker": {"pid": os.getpid(), "leader": is_leader},
     })
 
 
+@app.route("/ready")
+def ready():
+    """
+    آمادگی worker برای ترافیک (جدا از /health)
+
+    تا وقتی قیمتی برای سرو نیست و اولین بروزرسانی تمام نشده 503 برمی‌گردد.
+    """
+    has_prices = bool(data_store["prices"])
+    is_ready = has_prices or warmup["state"] in ("done", "failed", "skipped")
+    return jsonify({
+        "ready": is_ready,
+        "has_prices": has_prices,
+        "stale": prices_are_stale(),
+        "warm_up": warmup,
+        "boot_ms": round(boot_seconds * 1000, 1),
+        "worker": {"pid": os.getpid(), "leader": is_leader},
+    }), 200 if is_ready else 503
+
+
+@app.route("/metrics")
+def metrics():
+    """متریک‌ها با فرمت متنی Prometheus؛ شمارنده‌ها و هیستوگرام‌ها مجموع همه worker ها"""
+    return Response(REGISTRY.render(shared.collect_metrics()), mimetype="text/plain; version=0.0.4")
+
+
+def refresh_state():
+    """وضعیت فعلی زمان‌بندی بروزرسانی برای /health"""
+    state = cadence.state()
+    job = scheduler.get_job("update_prices")
+    state["next_run"] = job.next_run_time.isoformat() if job and job.next_run_time else None
+    return state
+
+
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 5000))
     logger.info("Starting server on %s", port)
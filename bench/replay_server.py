@@ -0,0 +1,154 @@
+"""
+سرور محلی جایگزین api.shirazgoldandsilver.ir که پاسخ‌های ضبط‌شده را پخش می‌کند
+
+    python bench/replay_server.py --port 8765 --latency 0.2 --error-rate 0.05
+
+و سپس:
+
+    SHIRAZ_API_BASE_URL=http://127.0.0.1:8765/api/v1 python app.py
+"""
+import argparse
+import copy
+import json
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+ROUTES = {
+    ("POST", "/api/v1/auth/check-mobile-exists"): "check_mobile_exists.json",
+    ("POST", "/api/v1/auth/login"): "login.json",
+    ("GET", "/api/v1/profile/homepage"): "homepage.json",
+}
+
+
+def load_fixture(name):
+    with open(os.path.join(FIXTURES_DIR, name), "rb") as f:
+        return json.load(f)
+
+
+def scale_homepage(payload, categories=1, products=1):
+    """بزرگ کردن payload صفحه اصلی: categories برابر دسته و products برابر محصول"""
+    data = copy.deepcopy(payload)
+    main = data["data"]
+    base_cats = main["user_categories"]
+    base_feats = main["features_data"]["silver"]
+
+    feats = []
+    for k in range(products):
+        for it in base_feats:
+            feats.append(dict(it, id=it["id"] + k * 1000))
+    main["features_data"]["silver"] = feats
+
+    cats = []
+    for k in range(categories):
+        for cat in base_cats:
+            silvers = [
+                dict(s, id=s["id"] + j * 1000)
+                for j in range(products)
+                for s in cat["silvers"]
+            ]
+            cats.append(dict(cat, id=cat["id"] + k * 100 if k else cat["id"], silvers=silvers))
+    main["user_categories"] = cats
+    return data
+
+
+class ReplayConfig:
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, unauthorized_rate=0.0,
+                 categories=1, products=1):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.unauthorized_rate = unauthorized_rate
+        self.bodies = {}
+        for key, name in ROUTES.items():
+            payload = load_fixture(name)
+            if name == "homepage.json":
+                payload = scale_homepage(payload, categories, products)
+            self.bodies[key] = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.hits = {}
+        self.lock = threading.Lock()
+
+
+def make_handler(config):
+    class ReplayHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _reply(self, status, body):
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _handle(self, method):
+            length = int(self.headers.get("Content-Length") or 0)
+            if length:
+                self.rfile.read(length)
+
+            key = (method, self.path.split("?")[0])
+            with config.lock:
+                config.hits[key[1]] = config.hits.get(key[1], 0) + 1
+
+            delay = config.latency + random.uniform(0, config.jitter)
+            if delay:
+                time.sleep(delay)
+
+            body = config.bodies.get(key)
+            if body is None:
+                return self._reply(404, b'{"success":false,"message":"not found"}')
+            if random.random() < config.error_rate:
+                return self._reply(500, b'{"success":false,"message":"server error"}')
+            if key[1].endswith("/homepage") and random.random() < config.unauthorized_rate:
+                return self._reply(401, b'{"success":false,"message":"Unauthenticated."}')
+            return self._reply(200, body)
+
+        def do_GET(self):
+            self._handle("GET")
+
+        def do_POST(self):
+            self._handle("POST")
+
+    return ReplayHandler
+
+
+def start_server(config=None, host="127.0.0.1", port=0):
+    """اجرای سرور در thread پس‌زمینه؛ خروجی: (server, base_url)"""
+    config = config or ReplayConfig()
+    server = ThreadingHTTPServer((host, port), make_handler(config))
+    server.daemon_threads = True
+    server.config = config
+    threading.Thread(target=server.serve_forever, name="replay-server", daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/api/v1"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded upstream responses")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="fixed delay per request (s)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="extra random delay up to N seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of 500 responses")
+    parser.add_argument("--unauthorized-rate", type=float, default=0.0, help="fraction of 401 on homepage")
+    parser.add_argument("--categories", type=int, default=1, help="multiply user_categories")
+    parser.add_argument("--products", type=int, default=1, help="multiply products per category")
+    args = parser.parse_args()
+
+    config = ReplayConfig(args.latency, args.jitter, args.error_rate, args.unauthorized_rate,
+                          args.categories, args.products)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(config))
+    print(f"replaying on http://{args.host}:{args.port}/api/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
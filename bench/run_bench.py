@@ -0,0 +1,204 @@
+"""
+بنچمارک مسیر دریافت/تبدیل قیمت‌ها روی سرور replay محلی
+
+    python bench/run_bench.py --output bench_output.json
+
+خروجی JSON شامل throughput و p50/p99 (میلی‌ثانیه) برای هر سناریو است تا
+بتوان نتایج دو اجرا را مقایسه کرد.
+"""
+import argparse
+import contextlib
+import io
+import json
+import logging
+import os
+import platform
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from replay_server import ReplayConfig, load_fixture, scale_homepage, start_server  # noqa: E402
+from webhook_receiver import ReceiverConfig, start_receiver  # noqa: E402
+
+
+def summarize(name, latencies, wall):
+    latencies = sorted(latencies)
+    n = len(latencies)
+
+    def pct(p):
+        return round(latencies[min(n - 1, int(p * n))] * 1000, 3) if n else None
+
+    return {
+        "name": name,
+        "iterations": n,
+        "throughput_per_s": round(n / wall, 1) if wall else None,
+        "p50_ms": pct(0.50),
+        "p99_ms": pct(0.99),
+        "max_ms": round(latencies[-1] * 1000, 3) if n else None,
+    }
+
+
+def run_serial(name, fn, iterations):
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(iterations):
+        t = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - t)
+    return summarize(name, latencies, time.perf_counter() - start)
+
+
+def run_concurrent(name, fn, iterations, concurrency):
+    latencies = []
+    lock = threading.Lock()
+
+    def one(_):
+        t = time.perf_counter()
+        fn()
+        d = time.perf_counter() - t
+        with lock:
+            latencies.append(d)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        list(pool.map(one, range(iterations)))
+    result = summarize(name, latencies, time.perf_counter() - start)
+    result["concurrency"] = concurrency
+    return result
+
+
+def run_alert_delivery(upstream, events, error_rate, timeout=60):
+    """ارسال events هشدار با AlertDispatcher به گیرنده محلی (با درصدی خطای 503)"""
+    from alerts import AlertDispatcher
+
+    config = ReceiverConfig(error_rate=error_rate)
+    receiver, url = start_receiver(config)
+    dispatcher = AlertDispatcher([url], max_queue=events, batch_wait=0.05, attempts=8,
+                                 base_delay=0.01, max_delay=0.2)
+    dispatcher.start(upstream)
+    start = time.perf_counter()
+    for i in range(0, events, 10):
+        dispatcher.submit([{"type": "move", "id": i + j, "seq": i + j} for j in range(min(10, events - i))])
+    deadline = start + timeout
+    while len(config.events) < events and time.perf_counter() < deadline:
+        time.sleep(0.01)
+    wall = time.perf_counter() - start
+    receiver.shutdown()
+    delivered = {e["seq"] for e in config.events}
+    return {
+        "name": "alert_delivery",
+        "events": events,
+        "delivered": len(delivered),
+        "duplicates": len(config.events) - len(delivered),
+        "batches": len(config.batches),
+        "requests": config.requests,
+        "throughput_per_s": round(len(delivered) / wall, 1) if wall else None,
+        "wall_ms": round(wall * 1000, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the fetch/transform pipeline")
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--update-iterations", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--latency", type=float, default=0.0, help="replay server latency (s)")
+    parser.add_argument("--categories", type=int, default=1)
+    parser.add_argument("--products", type=int, default=1)
+    parser.add_argument("--alert-events", type=int, default=1000)
+    parser.add_argument("--webhook-error-rate", type=float, default=0.2, help="fraction of 503 from the receiver")
+    parser.add_argument("--output", help="write JSON results to this file")
+    args = parser.parse_args()
+
+    config = ReplayConfig(latency=args.latency, categories=args.categories, products=args.products)
+    server, base_url = start_server(config)
+    os.environ["SHIRAZ_API_BASE_URL"] = base_url
+
+    # app فایل‌های داده را در مسیر جاری می‌سازد؛ در یک پوشه موقت اجرا شود
+    os.chdir(tempfile.mkdtemp(prefix="silver-bench-"))
+
+    import requests
+    from werkzeug.serving import make_server
+    import api_scraper
+    import app as app_module
+
+    logging.getLogger().setLevel(logging.WARNING)
+    results = []
+    quiet = contextlib.redirect_stdout(io.StringIO())
+
+    with quiet:
+        # ۱) پارس پاسخ /profile/homepage
+        payload = scale_homepage(load_fixture("homepage.json"), args.categories, args.products)
+        raw = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        parser_client = api_scraper.ShirazSilverAPI()
+        results.append(run_serial(
+            "parse_homepage",
+            lambda: parser_client._prices_result(200, parser_client.homepage.parse(raw)),
+            args.iterations,
+        ))
+
+        # ۲) اعمال درصد افزایش
+        prices = parser_client._prices_result(200, parser_client.homepage.parse(raw))["prices"]
+        app_module.data_store["increase_percentage"] = 1.5
+        app_module.compile_pricing()
+        results.append(run_serial(
+            "apply_markup",
+            lambda: app_module.apply_markup(prices),
+            args.iterations,
+        ))
+
+        # ۳) کل update job روی سرور replay
+        token = load_fixture("login.json")["data"]["token"]
+        app_module.api_scraper.set_token(token)
+        app_module.token_manager.set(token)
+        app_module.data_store["is_configured"] = True
+        app_module.cadence.hourly_budget = 10 ** 9
+        results.append(run_serial("update_prices_job", app_module.update_prices_job, args.update_iterations))
+
+    # ۴) /api/prices زیر بار همزمان روی یک سرور WSGI واقعی
+    http = make_server("127.0.0.1", 0, app_module.app, threaded=True)
+    threading.Thread(target=http.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{http.server_port}/api/prices"
+    local = threading.local()
+
+    def session():
+        s = getattr(local, "s", None)
+        if s is None:
+            s = local.s = requests.Session()
+        return s
+
+    etag = session().get(url).headers.get("ETag")
+    results.append(run_concurrent(
+        "api_prices_full", lambda: session().get(url), args.iterations, args.concurrency))
+    results.append(run_concurrent(
+        "api_prices_304", lambda: session().get(url, headers={"If-None-Match": etag}),
+        args.iterations, args.concurrency))
+    http.shutdown()
+
+    # ۵) ارسال هشدار به webhook محلی با خطای موقت و تلاش دوباره
+    results.append(run_alert_delivery(app_module.upstream, args.alert_events, args.webhook_error_rate))
+    server.shutdown()
+
+    report = {
+        "timestamp": time.time(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "params": vars(args),
+        "upstream_hits": config.hits,
+        "results": results,
+    }
+    out = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(os.path.join(ROOT, args.output) if not os.path.isabs(args.output) else args.output, "w") as f:
+            f.write(out + "\n")
+    print(out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+گیرنده محلی webhook برای آزمایش ارسال هشدارها
+
+    python bench/webhook_receiver.py --port 8766 --error-rate 0.3
+
+و سپس:
+
+    ALERT_WEBHOOKS=http://127.0.0.1:8766/alerts python app.py
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class ReceiverConfig:
+    def __init__(self, error_rate=0.0, latency=0.0, verbose=False):
+        self.error_rate = error_rate
+        self.latency = latency
+        self.verbose = verbose
+        # دسته‌های دریافت‌شده (فقط پاسخ‌های 200)
+        self.batches = []
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    @property
+    def events(self):
+        with self.lock:
+            return [event for batch in self.batches for event in batch["events"]]
+
+
+def make_handler(config):
+    class ReceiverHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _reply(self, status, body):
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            raw = self.rfile.read(length) if length else b""
+            with config.lock:
+                config.requests += 1
+            if config.latency:
+                time.sleep(config.latency)
+            if random.random() < config.error_rate:
+                return self._reply(503, b'{"ok":false}')
+            try:
+                batch = json.loads(raw)
+            except ValueError:
+                return self._reply(400, b'{"ok":false}')
+            with config.lock:
+                config.batches.append(batch)
+            if config.verbose:
+                for event in batch.get("events", []):
+                    print(json.dumps(event, ensure_ascii=False))
+            return self._reply(200, b'{"ok":true}')
+
+    return ReceiverHandler
+
+
+def start_receiver(config=None, host="127.0.0.1", port=0):
+    """اجرای گیرنده در thread پس‌زمینه؛ خروجی: (server, url)"""
+    config = config or ReceiverConfig()
+    server = ThreadingHTTPServer((host, port), make_handler(config))
+    server.daemon_threads = True
+    server.config = config
+    threading.Thread(target=server.serve_forever, name="webhook-receiver", daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/alerts"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local webhook receiver for price alerts")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of 503 responses")
+    parser.add_argument("--latency", type=float, default=0.0, help="fixed delay per request (s)")
+    args = parser.parse_args()
+
+    config = ReceiverConfig(args.error_rate, args.latency, verbose=True)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(config))
+    print(f"receiving on http://{args.host}:{args.port}/alerts")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
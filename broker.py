@@ -0,0 +1,80 @@
+import threading
+from collections import deque
+
+from price_model import encode_json
+
+# فیلدهایی که تغییرشان باید برای کلاینت‌ها push شود
+WATCHED_FIELDS = ("buy_price", "sell_price", "buy_status", "sell_status", "is_active", "status_text")
+
+
+def changed_rows(old_prices, new_prices):
+    """ردیف‌هایی از new_prices که قیمت یا وضعیتشان نسبت به old_prices عوض شده"""
+    old_by_id = {p.get("id"): p for p in old_prices or []}
+    changed = []
+    for p in new_prices:
+        old = old_by_id.get(p.get("id"))
+        if old is None or any(old.get(k) != p.get(k) for k in WATCHED_FIELDS):
+            changed.append(p)
+    return changed
+
+
+class PriceBroker:
+    """
+    پخش رویدادها به همه مشترک‌های SSE درون همین پردازه
+
+    به‌جای یک صف برای هر کلاینت، رویدادها یک بار encode و در یک بافر حلقوی
+    نگه داشته می‌شوند و هر مشترک فقط شماره آخرین رویداد دیده‌شده را دارد.
+    انتظار روی Condition است، پس با worker های gevent هر اتصال بیکار فقط
+    یک greenlet است و نه یک thread.
+    """
+
+    def __init__(self, backlog=64, heartbeat=15.0):
+        self._cond = threading.Condition()
+        self._events = deque(maxlen=backlog)
+        self._seq = 0
+        self.heartbeat = heartbeat
+        self.subscribers = 0
+
+    def publish(self, event, data):
+        """ارسال یک رویداد برای همه مشترک‌ها"""
+        payload = encode_json(data).decode("utf-8")
+        with self._cond:
+            self._seq += 1
+            frame = f"id: {self._seq}\nevent: {event}\ndata: {payload}\n\n".encode("utf-8")
+            self._events.append((self._seq, frame))
+            self._cond.notify_all()
+
+    def listen(self, last_event_id=None):
+        """ژنراتور فریم‌های SSE برای یک کلاینت"""
+        with self._cond:
+            seq = self._seq
+            self.subscribers += 1
+        if last_event_id is not None and last_event_id.isdigit():
+            seq = min(int(last_event_id), seq)
+
+        try:
+            yield b"retry: 5000\n\n"
+            while True:
+                with self._cond:
+                    if self._seq == seq:
+                        self._cond.wait(self.heartbeat)
+                    pending = [e for e in self._events if e[0] > seq]
+                    oldest = self._events[0][0] if self._events else self._seq + 1
+                    head = self._seq
+
+                if not pending:
+                    yield b": ping\n\n"
+                    continue
+
+                # کلاینت از بافر عقب افتاده؛ باید کل قیمت‌ها را دوباره بگیرد
+                if seq + 1 < oldest:
+                    yield f"id: {head}\nevent: resync\ndata: {{}}\n\n".encode("utf-8")
+                    seq = head
+                    continue
+
+                for s, frame in pending:
+                    yield frame
+                    seq = s
+        finally:
+            with self._cond:
+                self.subscribers -= 1
@@ -0,0 +1,90 @@
+import threading
+import time
+
+import numpy as np
+
+# عرض هر بازه (ثانیه)
+BUCKETS = {"1m": 60, "10m": 600, "1h": 3600, "1d": 86400}
+
+# بازه‌های روزانه از نیمه‌شب تهران شروع می‌شوند (UTC+03:30)
+TZ_OFFSET = 3 * 3600 + 30 * 60
+
+CANDLE = np.dtype([
+    ("t", "<f8"),
+    ("buy_open", "<i8"), ("buy_high", "<i8"), ("buy_low", "<i8"), ("buy_close", "<i8"),
+    ("sell_open", "<i8"), ("sell_high", "<i8"), ("sell_low", "<i8"), ("sell_close", "<i8"),
+])
+
+
+def ohlc(records, width):
+    """تجمیع برداری رکوردهای تاریخچه (مرتب بر اساس ts) به کندل‌های OHLC"""
+    if len(records) == 0:
+        return np.empty(0, dtype=CANDLE)
+
+    ts = records["ts"]
+    keys = np.floor((ts + TZ_OFFSET) / width).astype(np.int64)
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    ends = np.r_[starts[1:], len(keys)] - 1
+
+    out = np.empty(len(starts), dtype=CANDLE)
+    out["t"] = keys[starts] * width - TZ_OFFSET
+    for side in ("buy", "sell"):
+        v = np.asarray(records[side])
+        out[f"{side}_open"] = v[starts]
+        out[f"{side}_high"] = np.maximum.reduceat(v, starts)
+        out[f"{side}_low"] = np.minimum.reduceat(v, starts)
+        out[f"{side}_close"] = v[ends]
+    return out
+
+
+class CandleCache:
+    """
+    کش کندل‌ها برای هر (id، عرض بازه)
+
+    کندل‌های بسته (که زمانشان تمام شده) یک بار محاسبه و برای همیشه نگه داشته
+    می‌شوند؛ در هر درخواست فقط رکوردهای بعد از آخرین کندل بسته از تاریخچه
+    خوانده و تجمیع می‌شوند.
+    """
+
+    def __init__(self, history):
+        self.history = history
+        self._lock = threading.Lock()
+        # {(sid, width): (closed_candles, closed_until)}
+        self._closed = {}
+
+    def candles(self, sid, width, start=None, end=None, now=None):
+        now = time.time() if now is None else now
+        key = (sid, width)
+        with self._lock:
+            closed, until = self._closed.get(key, (np.empty(0, dtype=CANDLE), None))
+            fresh = ohlc(self.history.read(sid, start=until), width)
+
+            # کندل‌هایی که بازه‌شان تمام شده به کش دائمی اضافه می‌شوند
+            n_closed = int(np.searchsorted(fresh["t"] + width, now, side="right"))
+            if n_closed:
+                closed = np.concatenate([closed, fresh[:n_closed]])
+                until = float(closed["t"][-1] + width)
+                self._closed[key] = (closed, until)
+            current = fresh[n_closed:]
+
+        result = np.concatenate([closed, current]) if len(current) else closed
+        lo = 0 if start is None else int(np.searchsorted(result["t"] + width, start, side="right"))
+        hi = len(result) if end is None else int(np.searchsorted(result["t"], end, side="left"))
+        return result[lo:hi]
+
+
+def candles_to_json(candles, markup=None):
+    """
+    تبدیل کندل‌ها به ساختار ستونی JSON
+
+    markup(buy_col, sell_col) → (buy_col, sell_col) تابع برداری اعمال قوانین قیمت است
+    """
+    out = {"t": candles["t"].astype(np.int64).tolist(), "buy": {}, "sell": {}}
+    for part in ("open", "high", "low", "close"):
+        buy = candles[f"buy_{part}"]
+        sell = candles[f"sell_{part}"]
+        if markup is not None:
+            buy, sell = markup(buy, sell)
+        out["buy"][part] = buy.tolist()
+        out["sell"][part] = sell.tolist()
+    return out
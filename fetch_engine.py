@@ -0,0 +1,120 @@
+import asyncio
+import json
+import logging
+import os
+import time
+
+from api_scraper import AsyncShirazSilverAPI
+
+logger = logging.getLogger(__name__)
+
+ACCOUNTS_FILE = os.environ.get("ACCOUNTS_FILE", "accounts.json")
+
+
+class Account:
+    """یک حساب نماینده با توکن و دسته‌های قیمت خودش"""
+
+    def __init__(self, name, token, mobile=None, categories=None, min_interval=60):
+        self.name = name
+        self.mobile = mobile
+        # None یعنی دسته پیش‌فرض خود کاربر
+        self.categories = list(categories) if categories else [None]
+        self.min_interval = float(min_interval)
+        self.api = AsyncShirazSilverAPI()
+        if token:
+            self.api.set_token(token)
+        self.last_fetch = 0.0
+
+    def table_key(self, category_id):
+        return self.name if category_id is None else f"{self.name}:{category_id}"
+
+
+def load_accounts(path=ACCOUNTS_FILE):
+    """
+    خواندن حساب‌ها از فایل JSON:
+    [{"name": "...", "token": "...", "categories": [3, 5], "min_interval": 60}, ...]
+    """
+    if not os.path.exists(path):
+        return []
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            items = json.load(f)
+        return [
+            Account(
+                it["name"],
+                it.get("token"),
+                mobile=it.get("mobile"),
+                categories=it.get("categories"),
+                min_interval=it.get("min_interval", 60),
+            )
+            for it in items
+        ]
+    except Exception as e:
+        logger.error(f"Error loading accounts: {e}")
+        return []
+
+
+class FetchEngine:
+    """
+    بروزرسانی همزمان قیمت چند حساب / چند دسته
+
+    همه حساب‌ها روی یک event loop و با حداکثر max_workers درخواست همزمان
+    گرفته می‌شوند، پس اضافه شدن حساب زمان هر دور را خطی زیاد نمی‌کند.
+    هر حساب هم حداقل min_interval ثانیه بین دو درخواست فاصله دارد.
+    """
+
+    def __init__(self, accounts, max_workers=4, transform=None):
+        # transform(prices, category_id): مثلاً اعمال قوانین قیمت‌گذاری
+        self.accounts = {a.name: a for a in accounts}
+        self.max_workers = max_workers
+        self.transform = transform
+        # جدول قیمت هر حساب/دسته: {key: {"prices", "updated_at", "success", "message"}}
+        self.tables = {}
+
+    async def _refresh_account(self, account, sem):
+        if time.monotonic() - account.last_fetch < account.min_interval:
+            return
+        async with sem:
+            account.last_fetch = time.monotonic()
+            if account.categories == [None]:
+                results = {None: await account.api.get_silver_prices()}
+            else:
+                results = await account.api.get_category_prices(account.categories)
+
+        for cid, res in results.items():
+            key = account.table_key(cid)
+            table = self.tables.setdefault(key, {"prices": [], "updated_at": None})
+            table["success"] = res["success"]
+            table["message"] = res.get("message")
+            if res["success"]:
+                prices = res["prices"]
+                table["prices"] = self.transform(prices, cid) if self.transform else prices
+                table["updated_at"] = time.time()
+            else:
+                logger.warning("account %s refresh error: %s", key, res.get("message"))
+
+    async def refresh_all(self):
+        """یک دور بروزرسانی همه حساب‌ها به‌صورت همزمان"""
+        sem = asyncio.Semaphore(self.max_workers)
+        accounts = list(self.accounts.values())
+        results = await asyncio.gather(
+            *(self._refresh_account(a, sem) for a in accounts),
+            return_exceptions=True,
+        )
+        for account, r in zip(accounts, results):
+            if isinstance(r, Exception):
+                logger.error("account %s refresh failed: %r", account.name, r)
+        return self.tables
+
+    def summary(self, tables=None):
+        """وضعیت جدول‌ها؛ tables پیش‌فرض جدول‌های همین engine"""
+        tables = self.tables if tables is None else tables
+        return {
+            key: {
+                "success": t.get("success"),
+                "message": t.get("message"),
+                "updated_at": t.get("updated_at"),
+                "count": len(t["prices"]),
+            }
+            for key, t in tables.items()
+        }
@@ -0,0 +1,113 @@
+import os
+import threading
+import time
+
+import numpy as np
+
+HISTORY_DIR = os.environ.get("HISTORY_DIR", "history")
+
+# رکورد با طول ثابت ۳۲ بایت: زمان (epoch)، قیمت پایه خرید/فروش، وضعیت
+RECORD = np.dtype([
+    ("ts", "<f8"),
+    ("buy", "<i8"),
+    ("sell", "<i8"),
+    ("status", "u1"),
+    ("_pad", "V7"),
+])
+
+# بیت‌های فیلد status
+BUY_ACTIVE = 1
+SELL_ACTIVE = 2
+ACTIVE = 4
+
+
+def encode_status(p):
+    return (
+        (BUY_ACTIVE if p.get("buy_status") else 0)
+        | (SELL_ACTIVE if p.get("sell_status") else 0)
+        | (ACTIVE if p.get("is_active") else 0)
+    )
+
+
+class PriceHistory:
+    """
+    تاریخچه append-only قیمت‌ها، یک فایل باینری برای هر id نقره
+
+    هر نمونه فقط یک رکورد ۳۲ بایتی به انتهای فایل اضافه می‌کند (O(1) مستقل از
+    طول تاریخچه). خواندن بازه با memmap و جستجوی دودویی روی ستون ts انجام
+    می‌شود و فقط صفحه‌های همان بازه از دیسک خوانده می‌شوند.
+    """
+
+    def __init__(self, root=HISTORY_DIR):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self._lock = threading.Lock()
+        self._files = {}
+        self._last_ts = {}
+
+    def _path(self, sid):
+        return os.path.join(self.root, f"{int(sid)}.bin")
+
+    def _file(self, sid):
+        f = self._files.get(sid)
+        if f is None:
+            path = self._path(sid)
+            f = self._files[sid] = open(path, "ab")
+            # حذف رکورد ناقص احتمالی (مثلاً بعد از crash وسط نوشتن)
+            size = f.tell()
+            if size % RECORD.itemsize:
+                f.truncate(size - size % RECORD.itemsize)
+                f.seek(0, os.SEEK_END)
+            if f.tell() >= RECORD.itemsize:
+                last = self.read(sid)[-1:]
+                self._last_ts[sid] = float(last["ts"][0])
+        return f
+
+    def append(self, prices, ts=None):
+        """افزودن یک نمونه برای همه ردیف‌های قیمت"""
+        ts = time.time() if ts is None else ts
+        with self._lock:
+            for p in prices:
+                sid = p.get("id")
+                if sid is None:
+                    continue
+                f = self._file(sid)
+                # ts باید صعودی بماند تا جستجوی دودویی درست کار کند
+                row_ts = max(ts, self._last_ts.get(sid, ts))
+                rec = np.zeros(1, dtype=RECORD)
+                rec["ts"] = row_ts
+                rec["buy"] = p.get("buy_price_base", 0)
+                rec["sell"] = p.get("sell_price_base", 0)
+                rec["status"] = encode_status(p)
+                f.write(rec.tobytes())
+                f.flush()
+                self._last_ts[sid] = row_ts
+
+    def ids(self):
+        """لیست id هایی که تاریخچه دارند"""
+        return sorted(
+            int(name[:-4]) for name in os.listdir(self.root)
+            if name.endswith(".bin") and name[:-4].isdigit()
+        )
+
+    def read(self, sid, start=None, end=None):
+        """رکوردهای بازه [start, end) به‌صورت آرایه ساخت‌یافته numpy (بدون کپی)"""
+        path = self._path(sid)
+        try:
+            n = os.path.getsize(path) // RECORD.itemsize
+        except OSError:
+            n = 0
+        if n == 0:
+            return np.empty(0, dtype=RECORD)
+
+        data = np.memmap(path, dtype=RECORD, mode="r", shape=(n,))
+        ts = data["ts"]
+        lo = 0 if start is None else int(np.searchsorted(ts, start, side="left"))
+        hi = n if end is None else int(np.searchsorted(ts, end, side="left"))
+        return data[lo:hi]
+
+    def close(self):
+        with self._lock:
+            for f in self._files.values():
+                f.close()
+            self._files.clear()
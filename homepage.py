@@ -0,0 +1,95 @@
+import json
+import threading
+
+from metrics import CACHE_HITS, CACHE_MISSES
+
+
+class FeatureIndex:
+    """index اطلاعات محصولات (features_data.silver) بر اساس id"""
+
+    def __init__(self, features, special_titles=()):
+        silver = features.get("silver", []) if isinstance(features, dict) else []
+        self.info = {it.get("id"): it for it in silver}
+        # id ردیف‌هایی که قیمتشان از فیلدهای gheram خوانده می‌شود
+        self.special_ids = frozenset(
+            sid for sid, it in self.info.items() if it.get("title") in special_titles
+        )
+
+
+class HomepageData:
+    """بخش‌های لازم پاسخ /profile/homepage"""
+
+    def __init__(self):
+        self.success = False
+        self.message = None
+        self.user_category_id = None
+        self.buy_status = 1
+        self.sell_status = 1
+        # {category_id: silvers} فقط برای دسته‌های خواسته‌شده
+        self.categories = {}
+        self.features = None
+
+    def silvers(self, category_id=None):
+        """ردیف‌های یک دسته (پیش‌فرض دسته کاربر)؛ اگر نباشد None"""
+        return self.categories.get(self.user_category_id if category_id is None else category_id)
+
+
+class HomepageParser:
+    """
+    پارس پاسخ /profile/homepage
+
+    بدنه با json.loads خوانده می‌شود و فقط دسته‌های خواسته‌شده نگه داشته
+    می‌شوند. index محصولات (features_data) بین درخواست‌ها کش می‌شود و فقط
+    وقتی محتوای features_data عوض شده باشد دوباره ساخته می‌شود.
+    """
+
+    def __init__(self, special_titles=()):
+        self.special_titles = frozenset(special_titles)
+        self._lock = threading.Lock()
+        self._features_data = None
+        self._features = None
+
+    def parse(self, raw, category_ids=None):
+        """
+        raw: بدنه پاسخ (bytes یا str)
+        category_ids: id دسته‌های لازم؛ None یعنی دسته خود کاربر (user_category_id)
+        """
+        body = json.loads(raw)
+        page = HomepageData()
+        if not isinstance(body, dict):
+            page.features = FeatureIndex({}, self.special_titles)
+            return page
+        page.success = body.get("success", False)
+        page.message = body.get("message")
+
+        data = body.get("data")
+        if not isinstance(data, dict):
+            data = {}
+        page.user_category_id = data.get("user_category_id")
+        page.buy_status = data.get("buy_status", 1)
+        page.sell_status = data.get("sell_status", 1)
+
+        wanted = set(category_ids) if category_ids is not None else {None}
+        if None in wanted:
+            wanted.add(page.user_category_id)
+        for cat in data.get("user_categories") or ():
+            if isinstance(cat, dict) and cat.get("id") in wanted:
+                page.categories[cat.get("id")] = cat.get("silvers", [])
+
+        page.features = self._feature_index(data.get("features_data"))
+        return page
+
+    def _feature_index(self, features):
+        """index محصولات؛ اگر محتوای features_data همان دفعه قبل باشد از کش"""
+        with self._lock:
+            # مقایسه dict ها در C انجام می‌شود و از ساخت دوباره index ارزان‌تر است
+            if self._features is not None and features == self._features_data:
+                CACHE_HITS.inc(cache="features")
+                return self._features
+
+        index = FeatureIndex(features, self.special_titles)
+        CACHE_MISSES.inc(cache="features")
+        with self._lock:
+            self._features_data = features
+            self._features = index
+        return index
@@ -0,0 +1,192 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import re
+import sys
+import threading
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+from metrics import LOG_DROPPED
+from ratelimit import Limit, LocalBucketStore
+
+TEXT_FORMAT = "%(asctime)s [%(levelname)s] %(message)s"
+
+# محدودیت پیش‌فرض رویدادهای پرتکرار ('N/S': N رکورد در S ثانیه)
+DEFAULT_RATE_LIMITS = {
+    "price_row": "50/1",
+    "rate_limited": "5/10",
+    "update_waiting": "5/10",
+    "session_missing": "1/300",
+}
+
+# فیلدهایی که مقدارشان هیچ‌وقت در لاگ نوشته نمی‌شود
+SENSITIVE_FIELDS = frozenset({"otp", "code", "token", "password", "authorization", "cookie", "cookies"})
+_REDACTIONS = (
+    # JWT
+    (re.compile(r"eyJ[\w-]+\.[\w-]+\.[\w-]*"), "eyJ***"),
+    (re.compile(r"(Bearer\s+)[^\s'\",]+", re.I), r"\1***"),
+    # "otp": "1234" ، otp=1234 ، 'token': '...'
+    (re.compile(r"""(["']?\b(?:otp|code|token|password)\b["']?\s*[:=]\s*["']?)[^"',\s}&]+""", re.I), r"\1***"),
+)
+
+# فیلدهای خود LogRecord؛ بقیه (extra) فیلدهای ساخت‌یافته هستند
+_RECORD_FIELDS = frozenset(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+def redact(text):
+    for pattern, repl in _REDACTIONS:
+        text = pattern.sub(repl, text)
+    return text
+
+
+def _redact_field(key, value):
+    if key.lower() in SENSITIVE_FIELDS:
+        return "***"
+    if isinstance(value, str):
+        return redact(value)
+    return value
+
+
+class JsonFormatter(logging.Formatter):
+    """هر رکورد یک خط JSON؛ فیلدهای extra هم کنار پیام نوشته می‌شوند"""
+
+    def format(self, record):
+        out = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": redact(record.getMessage()),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_FIELDS and not key.startswith("_"):
+                out[key] = _redact_field(key, value)
+        if record.exc_info:
+            out["exc"] = redact(self.formatException(record.exc_info))
+        return json.dumps(out, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """قالب متنی قبلی (برای اجرای محلی) با همان redaction"""
+
+    def format(self, record):
+        return redact(super().format(record))
+
+
+class EventThrottle(logging.Filter):
+    """
+    نمونه‌برداری و محدودیت نرخ رکوردهای پرتکرار بر اساس فیلد event
+
+    sample: {event: نسبت نگه‌داشتن}؛ rates: {event: Limit}. اولین رکوردی که
+    بعد از یک دوره محدودیت رد می‌شود تعداد رکوردهای حذف‌شده را در suppressed دارد.
+    """
+
+    def __init__(self, sample=None, rates=None):
+        super().__init__()
+        self.sample = dict(sample or {})
+        self.rates = dict(rates or {})
+        self._buckets = LocalBucketStore()
+        self._suppressed = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        event = getattr(record, "event", None)
+        if event is None:
+            return True
+        keep = self.sample.get(event)
+        if keep is not None:
+            if random.random() >= keep:
+                LOG_DROPPED.inc(reason="sampled")
+                return False
+            record.sample_rate = keep
+        limit = self.rates.get(event)
+        if limit is not None:
+            denied, _ = self._buckets.take([(event, limit)])
+            with self._lock:
+                if denied is not None:
+                    self._suppressed[event] = self._suppressed.get(event, 0) + 1
+                    LOG_DROPPED.inc(reason="rate_limited")
+                    return False
+                suppressed = self._suppressed.pop(event, 0)
+            if suppressed:
+                record.suppressed = suppressed
+        return True
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """
+    فقط رکورد را در صف می‌گذارد؛ format، redaction و نوشتن در thread listener
+
+    رکورد بدون format شدن در صف می‌رود، پس args لاگ نباید بعداً تغییر کنند.
+    اگر صف پر باشد رکورد کنار گذاشته می‌شود و thread صدازننده هرگز منتظر نمی‌ماند.
+    """
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_DROPPED.inc(reason="queue_full")
+
+
+def _parse_map(spec, convert):
+    """'a=1,b=2' → {a: convert('1'), ...}"""
+    out = {}
+    for item in (spec or "").split(","):
+        key, sep, value = item.partition("=")
+        if sep and key.strip():
+            out[key.strip()] = convert(value.strip())
+    return out
+
+
+_listener = None
+
+
+def stop_logging():
+    """نوشتن رکوردهای باقی‌مانده در صف و توقف listener"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def setup_logging(level=None, fmt=None, stream=None, queue_size=10000):
+    """
+    راه‌اندازی لاگ ناهمگام برای root logger
+
+    LOG_LEVEL، LOG_FORMAT (json یا text)، LOG_SAMPLE ('event=0.1,...') و
+    LOG_RATE_LIMIT ('event=N/S,...') از محیط خوانده می‌شوند.
+    """
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    level = level or os.environ.get("LOG_LEVEL", "INFO")
+    fmt = fmt or os.environ.get("LOG_FORMAT", "json")
+    rates = dict(DEFAULT_RATE_LIMITS)
+    rates.update(_parse_map(os.environ.get("LOG_RATE_LIMIT"), str))
+
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(JsonFormatter() if fmt == "json" else TextFormatter(TEXT_FORMAT))
+
+    limits = {event: Limit.parse(spec) for event, spec in rates.items()}
+    handler = NonBlockingQueueHandler(queue.Queue(maxsize=queue_size))
+    handler.addFilter(EventThrottle(
+        sample=_parse_map(os.environ.get("LOG_SAMPLE"), float),
+        rates={event: limit for event, limit in limits.items() if limit is not None},
+    ))
+
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(level)
+
+    _listener = QueueListener(handler.queue, output, respect_handler_level=True)
+    _listener.start()
+    # رکوردهای باقی‌مانده در صف قبل از خروج نوشته شوند
+    atexit.register(stop_logging)
+    return _listener
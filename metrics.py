@@ -0,0 +1,236 @@
+import threading
+import time
+from bisect import bisect_left
+
+# مرزهای پیش‌فرض هیستوگرام (ثانیه)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items())) if labels else ()
+
+
+def _format_labels(key, extra=None):
+    items = list(key) + (list(extra) if extra else [])
+    if not items:
+        return ""
+    parts = []
+    for k, v in items:
+        v = str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        parts.append(f'{k}="{v}"')
+    return "{" + ",".join(parts) + "}"
+
+
+def _load_key(key):
+    """کلید label ها از JSON (لیست جفت‌ها) به شکل _label_key"""
+    return tuple(tuple(pair) for pair in key)
+
+
+def _sort_key(item):
+    return [(k, str(v)) for k, v in item[0]]
+
+
+def _fmt(v):
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+class Counter:
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dump(self):
+        with self._lock:
+            return [[list(map(list, key)), v] for key, v in self._values.items()]
+
+    def render(self, others=()):
+        """others: خروجی dump همین متریک در worker های دیگر که با مقدار محلی جمع می‌شود"""
+        with self._lock:
+            values = dict(self._values)
+        for dumped in others:
+            for key, v in dumped:
+                key = _load_key(key)
+                values[key] = values.get(key, 0) + v
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for key, v in sorted(values.items(), key=_sort_key):
+            lines.append(f"{self.name}{_format_labels(key)} {_fmt(v)}")
+        return lines
+
+
+class Gauge:
+    """گیج با مقدار ثابت یا تابعی که هنگام خروجی گرفتن صدا زده می‌شود"""
+
+    def __init__(self, name, help_text, fn=None):
+        self.name = name
+        self.help = help_text
+        self._fn = fn
+        self._value = 0
+
+    def set(self, value):
+        self._value = value
+
+    def set_function(self, fn):
+        self._fn = fn
+
+    def dump(self):
+        return None
+
+    def render(self, others=()):
+        # گیج‌ها مقدار همین worker هستند و جمع نمی‌شوند
+        value = self._value
+        if self._fn is not None:
+            try:
+                value = self._fn()
+            except Exception:
+                value = float("nan")
+        return [
+            f"# HELP {self.name} {self.help}",
+            f"# TYPE {self.name} gauge",
+            f"{self.name} {_fmt(value)}",
+        ]
+
+
+class _Timer:
+    __slots__ = ("hist", "key", "start")
+
+    def __init__(self, hist, key):
+        self.hist = hist
+        self.key = key
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.hist._observe(self.key, time.perf_counter() - self.start)
+        return False
+
+
+class Histogram:
+    """
+    هیستوگرام با مرزهای ثابت؛ هر observe فقط یک جستجوی دودویی و یک
+    افزایش شمارنده زیر قفل است.
+    """
+
+    def __init__(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        # {label_key: [counts..., sum, count]}
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def _observe(self, key, value):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            s = self._series.get(key)
+            if s is None:
+                s = self._series[key] = [0] * (len(self.buckets) + 3)
+            s[i] += 1
+            s[-2] += value
+            s[-1] += 1
+
+    def observe(self, value, **labels):
+        self._observe(_label_key(labels), value)
+
+    def time(self, **labels):
+        """context manager برای اندازه‌گیری مدت اجرای یک بلوک"""
+        return _Timer(self, _label_key(labels))
+
+    def dump(self):
+        with self._lock:
+            return [[list(map(list, key)), list(s)] for key, s in self._series.items()]
+
+    def render(self, others=()):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {k: list(v) for k, v in self._series.items()}
+        for dumped in others:
+            for key, other in dumped:
+                key = _load_key(key)
+                s = series.setdefault(key, [0] * len(other))
+                if len(s) == len(other):
+                    series[key] = [a + b for a, b in zip(s, other)]
+        for key, s in sorted(series.items(), key=_sort_key):
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), s[:-2]):
+                cumulative += n
+                lines.append(f"{self.name}_bucket{_format_labels(key, [('le', _fmt(bound))])} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {_fmt(s[-2])}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {s[-1]}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def dump(self):
+        """مقدار همه متریک‌ها به شکل JSON پذیر (برای جمع کردن بین worker ها)"""
+        return {m.name: m.dump() for m in self._metrics}
+
+    def render(self, others=()):
+        """others: خروجی dump رجیستری worker های دیگر"""
+        lines = []
+        for m in self._metrics:
+            lines.extend(m.render([d[m.name] for d in others if d.get(m.name)]))
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def counter(name, help_text):
+    return REGISTRY.register(Counter(name, help_text))
+
+
+def gauge(name, help_text, fn=None):
+    return REGISTRY.register(Gauge(name, help_text, fn))
+
+
+def histogram(name, help_text, buckets=DEFAULT_BUCKETS):
+    return REGISTRY.register(Histogram(name, help_text, buckets))
+
+
+# متریک‌های upstream
+UPSTREAM_LATENCY = histogram("upstream_request_seconds", "Latency of requests to the upstream API by operation")
+UPSTREAM_RESPONSES = counter("upstream_responses_total", "Upstream responses by operation and HTTP status")
+UPSTREAM_ERRORS = counter("upstream_errors_total", "Upstream requests that failed without a response")
+UPSTREAM_RETRIES = counter("upstream_retries_total", "Retried upstream requests")
+
+# متریک‌های HTTP
+HTTP_LATENCY = histogram("http_request_seconds", "Latency of HTTP requests by route")
+HTTP_NOT_MODIFIED = counter("http_not_modified_total", "304 Not Modified responses by route")
+CACHE_HITS = counter("cache_hits_total", "Responses served from a prebuilt cache by cache name")
+CACHE_MISSES = counter("cache_misses_total", "Cache rebuilds by cache name")
+RATE_LIMITED = counter("rate_limited_total", "Requests rejected by admission control by route group and scope")
+
+# متریک‌های بروزرسانی
+UPDATE_DURATION = histogram("update_job_seconds", "Duration of update_prices_job runs")
+UPDATE_RESULTS = counter("update_job_total", "update_prices_job runs by result")
+PRICES_STALENESS = gauge("prices_staleness_seconds", "Seconds since the last successful price update")
+
+# متریک‌های لاگ
+LOG_DROPPED = counter("log_records_dropped_total", "Log records not written by reason (sampled, rate_limited, queue_full)")
+
+# متریک‌های scraper جایگزین
+SCRAPER_PAGES = counter("scraper_pages_total", "Price page reads by the fallback scraper by path and result")
+
+# متریک‌های هشدار
+ALERT_EVENTS = counter("alert_events_total", "Price alert events by type")
+ALERT_DELIVERIES = counter("alert_deliveries_total", "Webhook batch deliveries by result")
+ALERT_DROPPED = counter("alert_dropped_total", "Alert events dropped because the delivery queue was full")
+ALERT_QUEUE = gauge("alert_queue_depth", "Alert events waiting for webhook delivery")
@@ -0,0 +1,89 @@
+import atexit
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class JsonStore:
+    """
+    ذخیره‌سازی JSON با نوشتن اتمیک (فایل موقت + rename) و write-behind
+
+    save() فقط آخرین وضعیت را ثبت می‌کند و برمی‌گردد؛ thread پس‌زمینه
+    تغییرات پشت‌سرهم را در یک نوشتن جمع می‌کند و اگر محتوا (hash) عوض
+    نشده باشد اصلاً روی دیسک نمی‌نویسد.
+    """
+
+    def __init__(self, path, flush_delay=1.0, default=None):
+        self.path = path
+        self.flush_delay = flush_delay
+        # برای اشیائی که json خودش نمی‌شناسد (مثل ردیف‌های قیمت)
+        self.default = default
+        self._pending = None
+        self._last_hash = None
+        self._cond = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._thread = None
+        atexit.register(self.flush)
+
+    def load(self):
+        """خواندن فایل؛ اگر وجود نداشته باشد None"""
+        if not os.path.exists(self.path):
+            return None
+        with open(self.path, "rb") as f:
+            raw = f.read()
+        self._last_hash = hashlib.blake2b(raw, digest_size=16).digest()
+        return json.loads(raw)
+
+    def save(self, data):
+        """ثبت وضعیت جدید برای نوشتن در پس‌زمینه (غیر مسدودکننده)"""
+        with self._cond:
+            self._pending = dict(data)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="json-store", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def flush(self):
+        """نوشتن همزمان آخرین وضعیت ثبت‌شده (برای خاموش شدن برنامه)"""
+        with self._cond:
+            data, self._pending = self._pending, None
+        if data is not None:
+            self._write(data)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._pending is None:
+                    self._cond.wait()
+            # چند save پشت‌سرهم در یک نوشتن جمع می‌شوند
+            with self._cond:
+                self._cond.wait(self.flush_delay)
+            self.flush()
+
+    def _write(self, data):
+        try:
+            raw = json.dumps(data, ensure_ascii=False, indent=2, default=self.default).encode("utf-8")
+            digest = hashlib.blake2b(raw, digest_size=16).digest()
+            with self._write_lock:
+                if digest == self._last_hash:
+                    return
+                directory = os.path.dirname(os.path.abspath(self.path))
+                fd, tmp = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=".json")
+                try:
+                    with os.fdopen(fd, "wb") as f:
+                        f.write(raw)
+                        f.flush()
+                        os.fsync(f.fileno())
+                    os.replace(tmp, self.path)
+                except BaseException:
+                    os.unlink(tmp)
+                    raise
+                self._last_hash = digest
+            logger.info("Data saved to file")
+        except Exception as e:
+            logger.error(f"Error saving data: {e}")
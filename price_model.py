@@ -0,0 +1,146 @@
+import json
+
+STATUS_ACTIVE = "فعال"
+STATUS_INACTIVE = "غیرفعال"
+
+
+def _dumps(value):
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class SilverPrice:
+    """
+    یک ردیف قیمت؛ تغییرناپذیر و با __slots__
+
+    is_active و status_text از وضعیت خرید/فروش محاسبه می‌شوند و در هر ردیف
+    ذخیره نمی‌شوند. JSON هر ردیف یک بار ساخته و کش می‌شود؛ ردیف‌هایی که
+    تغییر نکرده‌اند بین اسنپ‌شات‌ها همان شیء (و همان بایت‌ها) می‌مانند.
+    برای سازگاری با کد قبلی، خواندن به شکل dict (row["id"]، row.get) هم کار می‌کند.
+    """
+
+    __slots__ = (
+        "id", "name", "buy_price_base", "sell_price_base", "buy_price", "sell_price",
+        "buy_status", "sell_status", "increase_percentage", "_json",
+    )
+
+    # ترتیب کلیدها در JSON (همان ترتیب API قبلی)
+    KEYS = (
+        "id", "name", "buy_price_base", "sell_price_base", "buy_price", "sell_price",
+        "buy_status", "sell_status", "is_active", "status_text", "increase_percentage",
+    )
+
+    def __init__(self, id, name, buy_price_base, sell_price_base, buy_price=None, sell_price=None,
+                 buy_status=1, sell_status=1, increase_percentage=None):
+        set_ = object.__setattr__
+        set_(self, "id", id)
+        set_(self, "name", name)
+        set_(self, "buy_price_base", int(buy_price_base))
+        set_(self, "sell_price_base", int(sell_price_base))
+        set_(self, "buy_price", int(buy_price_base if buy_price is None else buy_price))
+        set_(self, "sell_price", int(sell_price_base if sell_price is None else sell_price))
+        set_(self, "buy_status", buy_status)
+        set_(self, "sell_status", sell_status)
+        set_(self, "increase_percentage", increase_percentage)
+        set_(self, "_json", None)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("SilverPrice is immutable")
+
+    @property
+    def is_active(self):
+        return bool(self.buy_status or self.sell_status)
+
+    @property
+    def status_text(self):
+        return STATUS_ACTIVE if self.is_active else STATUS_INACTIVE
+
+    @classmethod
+    def from_dict(cls, d):
+        """ساخت ردیف از dict (فایل ذخیره‌شده، state مشترک یا نسخه‌های قبلی)"""
+        if isinstance(d, cls):
+            return d
+        return cls(
+            d["id"], d["name"], d["buy_price_base"], d["sell_price_base"],
+            d.get("buy_price"), d.get("sell_price"),
+            d.get("buy_status", 1), d.get("sell_status", 1), d.get("increase_percentage"),
+        )
+
+    def priced(self, buy_price, sell_price, increase_percentage):
+        """ردیف با قیمت نهایی جدید؛ اگر چیزی عوض نشده همین ردیف برمی‌گردد"""
+        if (buy_price == self.buy_price and sell_price == self.sell_price
+                and increase_percentage == self.increase_percentage):
+            return self
+        return SilverPrice(
+            self.id, self.name, self.buy_price_base, self.sell_price_base, buy_price, sell_price,
+            self.buy_status, self.sell_status, increase_percentage,
+        )
+
+    def _values(self):
+        return (
+            self.id, self.name, self.buy_price_base, self.sell_price_base, self.buy_price,
+            self.sell_price, self.buy_status, self.sell_status, self.increase_percentage,
+        )
+
+    def __eq__(self, other):
+        if not isinstance(other, SilverPrice):
+            return NotImplemented
+        return self is other or self._values() == other._values()
+
+    __hash__ = None
+
+    def __getitem__(self, key):
+        if key not in self.KEYS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key, default=None):
+        return getattr(self, key) if key in self.KEYS else default
+
+    def to_dict(self):
+        d = {key: getattr(self, key) for key in self.KEYS}
+        if d["increase_percentage"] is None:
+            del d["increase_percentage"]
+        return d
+
+    @property
+    def json_bytes(self):
+        """JSON ردیف؛ فقط بار اول ساخته می‌شود"""
+        raw = self._json
+        if raw is None:
+            raw = _dumps(self.to_dict())
+            object.__setattr__(self, "_json", raw)
+        return raw
+
+    def __repr__(self):
+        return f"SilverPrice(id={self.id!r}, buy={self.buy_price}, sell={self.sell_price})"
+
+
+def reuse_unchanged(old_rows, new_rows):
+    """ردیف‌های جدیدی که با ردیف قبلی برابرند با همان شیء قبلی جایگزین می‌شوند"""
+    old_by_id = {r.id: r for r in old_rows or () if isinstance(r, SilverPrice)}
+    out = []
+    for row in new_rows:
+        old = old_by_id.get(row.id)
+        out.append(old if old is not None and old == row else row)
+    return out
+
+
+def encode_json(obj):
+    """
+    JSON بایتی؛ ردیف‌های SilverPrice از بایت‌های کش‌شده خودشان کپی می‌شوند
+    و فقط بقیه ساختار encode می‌شود
+    """
+    if isinstance(obj, SilverPrice):
+        return obj.json_bytes
+    if isinstance(obj, dict):
+        return b"{" + b",".join(_dumps(str(k)) + b":" + encode_json(v) for k, v in obj.items()) + b"}"
+    if isinstance(obj, (list, tuple)):
+        return b"[" + b",".join(encode_json(v) for v in obj) + b"]"
+    return _dumps(obj)
+
+
+def json_default(obj):
+    """برای json.dumps(default=...) جاهایی که از encode_json استفاده نمی‌کنند"""
+    if isinstance(obj, SilverPrice):
+        return obj.to_dict()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
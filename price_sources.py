@@ -0,0 +1,212 @@
+import asyncio
+import logging
+
+from api_scraper import is_transient
+from price_model import SilverPrice
+from resilience import retry_async
+
+logger = logging.getLogger(__name__)
+
+
+def make_row(sid, name, buy_base, sell_base, buy_status=1, sell_status=1):
+    """ردیف نرمال‌شده قیمت؛ همه منابع همین ساختار (SilverPrice) را برمی‌گردانند"""
+    return SilverPrice(sid, name, buy_base, sell_base, buy_status=buy_status, sell_status=sell_status)
+
+
+# یکسان‌سازی نام‌ها: حروف عربی/فارسی، ارقام و فاصله‌ها بین سایت و API فرق می‌کنند
+_NAME_CHARS = str.maketrans({
+    "ي": "ی", "ى": "ی", "ك": "ک", "\u200c": " ",
+    **{chr(0x06F0 + d): str(d) for d in range(10)},
+    **{chr(0x0660 + d): str(d) for d in range(10)},
+})
+
+
+def name_key(name):
+    """کلید مقایسه نام محصول"""
+    return " ".join(str(name).translate(_NAME_CHARS).split())
+
+
+class PriceSource:
+    """
+    رابط مشترک منابع قیمت
+
+    fetch() نتیجه‌ای به شکل {"success", "prices", "message"} برمی‌گرداند که
+    prices آن ردیف‌های make_row است.
+    """
+
+    name = "source"
+
+    async def fetch(self):
+        raise NotImplementedError
+
+
+class ApiSource(PriceSource):
+    """مسیر اصلی و سریع: API ساچمه‌خانه با تلاش دوباره و قطع‌کننده مدار"""
+
+    name = "api"
+
+    def __init__(self, api, breaker=None, attempts=3, ready=None, on_request=None):
+        self.api = api
+        self.breaker = breaker
+        self.attempts = attempts
+        self.ready = ready
+        self.on_request = on_request
+
+    async def fetch(self):
+        # با توکن منقضی یا ردشده درخواستی فرستاده نمی‌شود
+        if self.ready is not None and not self.ready():
+            return {"success": False, "prices": [], "message": "need_login"}
+        if self.breaker is not None and not self.breaker.allow():
+            return {"success": False, "transient": True, "prices": [], "message": "circuit_open"}
+
+        try:
+            res = await retry_async(
+                self._attempt, is_transient, attempts=self.attempts, op="get_silver_prices",
+            )
+        except asyncio.CancelledError:
+            # لغو در hedge یعنی upstream کند بوده، نه خراب؛ فقط درخواست آزمایشی آزاد می‌شود
+            if self.breaker is not None:
+                self.breaker.release()
+            raise
+        except BaseException:
+            if self.breaker is not None:
+                self.breaker.record_failure()
+            raise
+        if self.breaker is not None:
+            if is_transient(res):
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+        return res
+
+
+    def _attempt(self):
+        # هر تلاش (از جمله تلاش دوباره) یک درخواست واقعی در بودجه ساعتی است
+        if self.on_request is not None:
+            self.on_request()
+        return self.api.get_silver_prices()
+
+
+class ScraperSource(PriceSource):
+    """
+    مسیر جایگزین: مرورگر headless (scraper.py)
+
+    صفحه سایت id ندارد؛ id هر ردیف از روی نام و آخرین قیمت‌های API
+    (known_ids: {نام: id}) پیدا می‌شود. ردیفی که id آن پیدا نشود منتشر
+    نمی‌شود، چون تاریخچه، قوانین قیمت و هشدارها همه بر اساس id هستند.
+    """
+
+    name = "scraper"
+
+    def __init__(self, known_ids=None, scraper=None):
+        self.known_ids = known_ids
+        self.scraper = scraper
+
+    async def fetch(self):
+        if self.scraper is None:
+            # selenium فقط وقتی fallback فعال است لازم است
+            from scraper import ShirazSilverScraper
+            self.scraper = ShirazSilverScraper()
+
+        res = await asyncio.to_thread(self.scraper.get_silver_prices)
+        if not res["success"]:
+            return {"success": False, "transient": True, "prices": [], "message": res["message"]}
+
+        known = self.known_ids() if self.known_ids is not None else {}
+        # ردیف با همان نام API منتشر می‌شود تا diff ردیف‌ها (SSE) عوض نشود
+        ids = {name_key(name): (sid, name) for name, sid in known.items()}
+        prices = []
+        unmapped = []
+        for p in res["prices"]:
+            match = ids.get(name_key(p["name"]))
+            if match is None:
+                unmapped.append(p["name"])
+                continue
+            prices.append(make_row(
+                *match,
+                p["buy_price"],
+                p["sell_price"],
+                buy_status=1 if p["buy_price"] else 0,
+                sell_status=1 if p["sell_price"] else 0,
+            ))
+        if unmapped:
+            logger.warning("scraper rows without a known API id skipped: %s", ", ".join(unmapped))
+        if not prices:
+            return {"success": False, "transient": True, "prices": [], "message": "no_known_ids"}
+        return {"success": True, "prices": prices[:9], "message": "ok"}
+
+
+class FailoverSource(PriceSource):
+    """
+    ارکستراتور منابع قیمت
+
+    اول primary امتحان می‌شود و فقط در صورت شکست آن سراغ fallback می‌رود.
+    با hedge_after، اگر primary تا آن زمان جواب نداده باشد fallback هم
+    همزمان شروع می‌شود و اولین نتیجه موفق برداشته می‌شود. هر نتیجه با
+    source (نام منبع) برچسب می‌خورد.
+    """
+
+    def __init__(self, primary, fallback=None, hedge_after=None):
+        self.primary = primary
+        self.fallback = fallback
+        self.hedge_after = hedge_after
+
+    @staticmethod
+    def _tag(res, source):
+        res["source"] = source.name
+        return res
+
+    async def fetch(self):
+        if self.fallback is None:
+            return self._tag(await self.primary.fetch(), self.primary)
+
+        primary = asyncio.ensure_future(self.primary.fetch())
+        if self.hedge_after is None:
+            await primary
+        else:
+            await asyncio.wait({primary}, timeout=self.hedge_after)
+
+        if primary.done():
+            res = primary.result()
+            if res["success"]:
+                return self._tag(res, self.primary)
+            return await self._fall_back(res)
+        return await self._race(primary)
+
+    async def _fall_back(self, primary_res):
+        logger.warning("%s failed (%s), trying %s",
+                       self.primary.name, primary_res["message"], self.fallback.name)
+        res = await self.fallback.fetch()
+        return self._merge(primary_res, res)
+
+    async def _race(self, primary):
+        logger.info("%s slow, racing %s", self.primary.name, self.fallback.name)
+        fallback = asyncio.ensure_future(self.fallback.fetch())
+        pending = {primary, fallback}
+        results = {}
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                results[task] = task.result()
+                if results[task]["success"]:
+                    for other in pending:
+                        other.cancel()
+                    source = self.primary if task is primary else self.fallback
+                    res = self._tag(results[task], source)
+                    if task is fallback:
+                        res["primary"] = {"message": "cancelled"}
+                    return res
+        return self._merge(results[primary], results[fallback])
+
+    def _merge(self, primary_res, fallback_res):
+        """نتیجه نهایی بعد از fallback؛ وضعیت primary (مثلاً 401) حفظ می‌شود"""
+        primary_info = {"message": primary_res["message"], "status": primary_res.get("status")}
+        if fallback_res["success"]:
+            res = self._tag(fallback_res, self.fallback)
+            res["primary"] = primary_info
+            return res
+        # هر دو شکست خوردند؛ پیام primary (need_login، circuit_open، ...) مهم‌تر است
+        logger.warning("%s failed too: %s", self.fallback.name, fallback_res["message"])
+        res = self._tag(primary_res, self.primary)
+        res["fallback_message"] = fallback_res["message"]
+        return res
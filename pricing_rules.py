@@ -0,0 +1,228 @@
+import math
+import threading
+
+from price_model import SilverPrice
+
+ROUND_MODES = {"nearest": 0, "up": 1, "down": 2}
+
+# فیلدهای مجاز هر قانون و مقدار پیش‌فرض (بدون اثر)
+_FIELDS = {
+    "buy_markup_percent": 0.0,
+    "sell_markup_percent": 0.0,
+    "buy_offset": 0,
+    "sell_offset": 0,
+    "round_to": 0.0,
+    "round_mode": "nearest",
+    "min_spread": 0,
+}
+
+# سقف قدر مطلق مقدارها تا قیمت نهایی همیشه در int64 جا شود
+MAX_PERCENT = 1000
+MAX_AMOUNT = 10 ** 12
+_LIMITS = {
+    "buy_markup_percent": MAX_PERCENT,
+    "sell_markup_percent": MAX_PERCENT,
+    "markup_percent": MAX_PERCENT,
+    "increase_percentage": MAX_PERCENT,
+}
+
+
+class RuleError(ValueError):
+    pass
+
+
+def _number(key, value, kind):
+    """
+    تبدیل مقدار عددی فیلد با float یا int؛ مقدار نامعتبر RuleError می‌دهد
+
+    درصدها حداکثر MAX_PERCENT و مبلغ‌ها حداکثر MAX_AMOUNT هستند و عدد اعشاری
+    برای فیلد int (id، مبلغ) گرد نمی‌شود بلکه رد می‌شود.
+    """
+    if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+        raise RuleError(f"{key} must be a number")
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise RuleError(f"{key} must be a number") from None
+    if not math.isfinite(number):
+        raise RuleError(f"{key} must be a finite number")
+    limit = _LIMITS.get(key, MAX_AMOUNT)
+    if abs(number) > limit:
+        raise RuleError(f"{key} must be between -{limit} and {limit}")
+    if kind is int:
+        if not number.is_integer():
+            raise RuleError(f"{key} must be an integer")
+        return int(number)
+    return number
+
+
+def parse_percent(value):
+    """درصد افزایش سراسری (increase_percentage)؛ مقدار نامعتبر RuleError می‌دهد"""
+    return _number("increase_percentage", value or 0, float)
+
+
+def _id_set(key, values):
+    if values is None:
+        return None
+    if not isinstance(values, list):
+        raise RuleError(f"match.{key} must be a list")
+    return frozenset(_number(f"match.{key}", v, int) for v in values)
+
+
+def _normalize(rule):
+    """تبدیل یک قانون JSON به (شرط، پارامترها) و بررسی اعتبار"""
+    if not isinstance(rule, dict):
+        raise RuleError("rule must be an object")
+    unknown = set(rule) - set(_FIELDS) - {"match", "markup_percent", "offset", "name"}
+    if unknown:
+        raise RuleError(f"unknown rule fields: {', '.join(sorted(unknown))}")
+    match = rule.get("match") or {}
+    if not isinstance(match, dict):
+        raise RuleError("match must be an object")
+    cond = (_id_set("ids", match.get("ids")), _id_set("categories", match.get("categories")))
+
+    params = {}
+    # markup_percent / offset برای هر دو سمت خرید و فروش
+    if "markup_percent" in rule:
+        params["buy_markup_percent"] = params["sell_markup_percent"] = _number(
+            "markup_percent", rule["markup_percent"], float)
+    if "offset" in rule:
+        params["buy_offset"] = params["sell_offset"] = _number("offset", rule["offset"], int)
+    for key, default in _FIELDS.items():
+        if key in rule and key != "round_mode":
+            params[key] = _number(key, rule[key], type(default))
+    if "round_mode" in rule:
+        if rule["round_mode"] not in ROUND_MODES:
+            raise RuleError(f"round_mode must be one of {', '.join(ROUND_MODES)}")
+        params["round_mode"] = rule["round_mode"]
+    if params.get("round_to", 0) < 0:
+        raise RuleError("round_to must be >= 0")
+    return cond, params
+
+
+def _row_params(compiled, base_percent, sid, category):
+    p = dict(_FIELDS)
+    # درصد افزایش سراسری (increase_percentage) لایه پایه است
+    p["buy_markup_percent"] = p["sell_markup_percent"] = base_percent
+    for (ids, cats), params in compiled:
+        if ids is not None and sid not in ids:
+            continue
+        if cats is not None and category not in cats:
+            continue
+        p.update(params)
+    return p
+
+
+def _build_arrays(compiled, base_percent, ids, category):
+    """پارامترهای هر ردیف (به ترتیب ids) به شکل آرایه"""
+    # numpy با اولین اعمال قیمت import می‌شود، نه در شروع برنامه
+    import numpy as np
+
+    rows = [_row_params(compiled, base_percent, sid, category) for sid in ids]
+    return {
+        "buy_mult": np.array([1 + r["buy_markup_percent"] / 100 for r in rows], dtype=np.float64),
+        "sell_mult": np.array([1 + r["sell_markup_percent"] / 100 for r in rows], dtype=np.float64),
+        "buy_offset": np.array([r["buy_offset"] for r in rows], dtype=np.float64),
+        "sell_offset": np.array([r["sell_offset"] for r in rows], dtype=np.float64),
+        "round_to": np.array([r["round_to"] for r in rows], dtype=np.float64),
+        "round_mode": np.array([ROUND_MODES[r["round_mode"]] for r in rows]),
+        "min_spread": np.array([r["min_spread"] for r in rows], dtype=np.float64),
+    }
+
+
+class PricingRules:
+    """
+    موتور قوانین قیمت‌گذاری
+
+    قوانین (درصد افزایش و مبلغ ثابت برای خرید/فروش، گرد کردن و حداقل اختلاف
+    خرید و فروش) بر اساس id محصول یا دسته تطبیق داده می‌شوند و قانون‌های
+    بعدی فیلدهای قبلی را بازنویسی می‌کنند. پارامترهای هر ترکیب id ها یک بار
+    به آرایه تبدیل و کش می‌شوند و اعمال قیمت یک عملیات برداری روی همه
+    ردیف‌هاست.
+    """
+
+    def __init__(self, rules=(), base_percent=0.0):
+        self._lock = threading.Lock()
+        self.compile(rules, base_percent)
+
+    def compile(self, rules, base_percent=0.0):
+        """
+        کامپایل قوانین؛ در صورت نامعتبر بودن RuleError می‌دهد و قوانین قبلی می‌مانند
+
+        آرایه‌های ترکیب‌های id که تا الان استفاده شده‌اند همین‌جا دوباره ساخته
+        می‌شوند تا خطا قبل از جایگزینی قوانین فعلی دیده شود.
+        """
+        compiled = [_normalize(r) for r in rules or ()]
+        base_percent = parse_percent(base_percent)
+        cache = {
+            key: _build_arrays(compiled, base_percent, *key)
+            for key in list(getattr(self, "_cache", ()))
+        }
+        with self._lock:
+            self.rules = list(rules or ())
+            self.base_percent = base_percent
+            self._compiled = compiled
+            self._cache = cache
+
+    def _arrays(self, ids, category):
+        key = (ids, category)
+        arrays = self._cache.get(key)
+        if arrays is None:
+            with self._lock:
+                compiled, base_percent = self._compiled, self.base_percent
+            arrays = _build_arrays(compiled, base_percent, ids, category)
+            with self._lock:
+                if compiled is self._compiled:
+                    if len(self._cache) > 256:
+                        self._cache.clear()
+                    self._cache[key] = arrays
+        return arrays
+
+    @staticmethod
+    def _round(values, step, mode):
+        import numpy as np
+
+        safe = np.where(step > 0, step, 1)
+        q = values / safe
+        rounded = np.select(
+            [mode == 0, mode == 1],
+            [np.floor(q + 0.5), np.ceil(q)],
+            np.floor(q),
+        ) * safe
+        return np.where(step > 0, rounded, np.floor(values))
+
+    def apply_arrays(self, ids, buy_base, sell_base, category=None):
+        """
+        اعمال برداری قوانین؛ ids تاپل id ها و buy/sell آرایه‌های قیمت پایه
+
+        اگر ids فقط یک عضو داشته باشد، پارامترهایش روی کل آرایه‌ها broadcast می‌شود.
+        """
+        import numpy as np
+
+        a = self._arrays(tuple(ids), category)
+        buy = np.asarray(buy_base, dtype=np.float64) * a["buy_mult"] + a["buy_offset"]
+        sell = np.asarray(sell_base, dtype=np.float64) * a["sell_mult"] + a["sell_offset"]
+        buy = self._round(buy, a["round_to"], a["round_mode"])
+        sell = self._round(sell, a["round_to"], a["round_mode"])
+        # حداقل اختلاف فروش و خرید
+        sell = np.maximum(sell, buy + a["min_spread"])
+        return buy.astype(np.int64), sell.astype(np.int64)
+
+    def apply(self, prices, category=None):
+        """
+        محاسبه buy_price و sell_price همه ردیف‌ها از قیمت‌های پایه
+
+        لیست جدیدی از SilverPrice برمی‌گرداند؛ ردیف‌هایی که قیمتشان عوض
+        نشده همان شیء قبلی هستند.
+        """
+        if not prices:
+            return []
+        rows = [SilverPrice.from_dict(p) for p in prices]
+        ids = tuple(r.id for r in rows)
+        buy, sell = self.apply_arrays(
+            ids,
+            [r.buy_price_base for r in rows],
+            [r.sell_price_base for r in rows],
+            category,
+        )
+        return [r.priced(b, s, self.base_percent) for r, b, s in zip(rows, buy.tolist(), sell.tolist())]
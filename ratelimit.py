@@ -0,0 +1,174 @@
+import fcntl
+import hashlib
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+
+
+class Limit:
+    """bucket با ظرفیت burst که با نرخ rate (توکن در ثانیه) پر می‌شود"""
+
+    def __init__(self, burst, per_seconds):
+        self.burst = float(burst)
+        self.rate = self.burst / float(per_seconds)
+
+    @classmethod
+    def parse(cls, spec):
+        """'N/S' یعنی N درخواست در S ثانیه؛ رشته خالی یا 0 یعنی بدون محدودیت"""
+        if not spec or spec.strip() in ("0", "off"):
+            return None
+        burst, _, per = spec.partition("/")
+        return cls(int(burst), float(per or 1))
+
+
+def _take(buckets, now):
+    """
+    برداشت یک توکن از همه bucket ها یا هیچ‌کدام
+
+    buckets: لیست [tokens, updated, limit] که در جا بروزرسانی می‌شود.
+    خروجی: (اندیس اولین bucket خالی یا None، ثانیه تا توکن بعدی)
+    """
+    denied, retry_after = None, 0.0
+    for i, b in enumerate(buckets):
+        tokens, updated, limit = b
+        b[0] = min(limit.burst, tokens + max(0.0, now - updated) * limit.rate)
+        b[1] = now
+        if b[0] < 1:
+            wait = (1 - b[0]) / limit.rate
+            if wait > retry_after:
+                denied, retry_after = i, wait
+    if denied is None:
+        for b in buckets:
+            b[0] -= 1
+    return denied, retry_after
+
+
+class LocalBucketStore:
+    """bucket ها در حافظه همین پردازه"""
+
+    def __init__(self):
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def take(self, items, now=None):
+        """items: [(key, limit)]؛ خروجی مثل _take"""
+        now = time.time() if now is None else now
+        with self._lock:
+            buckets = []
+            for key, limit in items:
+                tokens, updated = self._buckets.get(key, (limit.burst, now))
+                buckets.append([tokens, updated, limit])
+            result = _take(buckets, now)
+            for (key, _), b in zip(items, buckets):
+                self._buckets[key] = (b[0], b[1])
+        return result
+
+
+class FileBucketStore:
+    """
+    جدول bucket ها در یک فایل mmap مشترک بین worker ها
+
+    هر bucket یک slot ثابت (hash کلید، توکن‌ها، زمان) است و خواندن/نوشتن
+    زیر flock فقط چند میکروثانیه طول می‌کشد. جدول اندازه ثابت دارد؛ اگر در
+    محدوده جستجو slot خالی نباشد، قدیمی‌ترین bucket جایگزین می‌شود.
+    """
+
+    SLOT = struct.Struct("<Qdd")
+
+    def __init__(self, path, slots=4096, probes=8):
+        self.slots = slots
+        self.probes = probes
+        size = slots * self.SLOT.size
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        if os.fstat(self._fd).st_size < size:
+            os.ftruncate(self._fd, size)
+        self._map = mmap.mmap(self._fd, size)
+        # flock بین پردازه‌هاست؛ thread های همین پردازه با قفل جدا
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _hash(key):
+        h = int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "little")
+        # 0 یعنی slot خالی
+        return h or 1
+
+    def _find(self, h, now):
+        """offset slot کلید؛ اگر نباشد یک slot خالی یا قدیمی‌ترین (و False)"""
+        start = h % self.slots
+        victim, oldest = None, None
+        for p in range(self.probes):
+            offset = ((start + p) % self.slots) * self.SLOT.size
+            slot_hash, _, updated = self.SLOT.unpack_from(self._map, offset)
+            if slot_hash == h:
+                return offset, True
+            if slot_hash == 0:
+                return offset, False
+            if oldest is None or updated < oldest:
+                victim, oldest = offset, updated
+        return victim, False
+
+    def take(self, items, now=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                slots = []
+                buckets = []
+                for key, limit in items:
+                    h = self._hash(key)
+                    offset, found = self._find(h, now)
+                    if found:
+                        _, tokens, updated = self.SLOT.unpack_from(self._map, offset)
+                    else:
+                        tokens, updated = limit.burst, now
+                    slots.append((offset, h))
+                    buckets.append([tokens, updated, limit])
+                result = _take(buckets, now)
+                for (offset, h), b in zip(slots, buckets):
+                    self.SLOT.pack_into(self._map, offset, h, b[0], b[1])
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+        return result
+
+
+class RateLimiter:
+    """
+    کنترل پذیرش برای route های پرهزینه
+
+    هر گروه route یک محدودیت برای هر کلاینت و یک محدودیت سراسری دارد؛
+    درخواست فقط وقتی پذیرفته می‌شود که هر دو bucket توکن داشته باشند.
+    """
+
+    def __init__(self, store, limits):
+        self.store = store
+        # {group: (محدودیت هر کلاینت، محدودیت سراسری)}
+        self.limits = limits
+
+    def check(self, group, client):
+        """خروجی: (None، 0) اگر پذیرفته شد، وگرنه (client یا global، ثانیه تا تلاش بعدی)"""
+        per_client, overall = self.limits.get(group, (None, None))
+        items, scopes = [], []
+        if per_client is not None:
+            items.append((f"{group}:client:{client}", per_client))
+            scopes.append("client")
+        if overall is not None:
+            items.append((f"{group}:global", overall))
+            scopes.append("global")
+        if not items:
+            return None, 0
+        denied, retry_after = self.store.take(items)
+        if denied is None:
+            return None, 0
+        return scopes[denied], max(1, math.ceil(retry_after))
+
+
+def bucket_store_from_env():
+    """همان backend اسنپ‌شات مشترک (SHARED_STATE): file یا local"""
+    if os.environ.get("SHARED_STATE", "file") == "local":
+        return LocalBucketStore()
+    directory = os.environ.get("SHARED_STATE_DIR", "shared_state")
+    os.makedirs(directory, exist_ok=True)
+    return FileBucketStore(os.path.join(directory, "ratelimit.bin"))
@@ -0,0 +1,106 @@
+import asyncio
+import random
+import threading
+import time
+
+from metrics import UPSTREAM_RETRIES
+
+
+async def retry_async(call, should_retry, attempts=3, base_delay=0.5, max_delay=5.0, op="upstream"):
+    """
+    اجرای call (تابعی که کوروتین برمی‌گرداند) با تلاش دوباره
+
+    بین تلاش‌ها backoff نمایی با jitter کامل است؛ اگر should_retry(نتیجه)
+    False باشد یا تلاش‌ها تمام شود، آخرین نتیجه برگردانده می‌شود.
+    """
+    res = None
+    for attempt in range(attempts):
+        res = await call()
+        if attempt == attempts - 1 or not should_retry(res):
+            return res
+        UPSTREAM_RETRIES.inc(op=op)
+        await asyncio.sleep(random.uniform(0, min(max_delay, base_delay * 2 ** attempt)))
+    return res
+
+
+class CircuitBreaker:
+    """
+    قطع‌کننده مدار برای upstream
+
+    closed: درخواست‌ها عادی انجام می‌شوند
+    open: بعد از failure_threshold خطای پشت‌سرهم، تا reset_timeout ثانیه هیچ
+          درخواستی فرستاده نمی‌شود
+    half_open: بعد از reset_timeout یک درخواست آزمایشی اجازه دارد؛ موفقیتش
+               مدار را می‌بندد و شکستش دوباره بازش می‌کند
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=3, reset_timeout=60.0, max_reset_timeout=600.0):
+        self.failure_threshold = failure_threshold
+        self.base_reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._state = self.CLOSED
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                return self.HALF_OPEN
+            return self._state
+
+    def allow(self):
+        """آیا الان می‌توان درخواست فرستاد؟"""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                # فقط یک درخواست آزمایشی
+                self._state = self.HALF_OPEN
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self.failures = 0
+            self.reset_timeout = self.base_reset_timeout
+
+    def release(self):
+        """
+        درخواستی که بدون نتیجه تمام شد (مثلاً لغو در hedge)؛ نه موفقیت و نه شکست
+
+        اگر همان درخواست آزمایشی half_open بوده، مدار بدون دو برابر شدن
+        reset_timeout به open برمی‌گردد تا درخواست بعدی دوباره آزمایش شود.
+        """
+        with self._lock:
+            if self._state == self.HALF_OPEN:
+                self._state = self.OPEN
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._state == self.HALF_OPEN:
+                # آزمایش ناموفق؛ مدت باز ماندن دو برابر می‌شود
+                self.reset_timeout = min(self.max_reset_timeout, self.reset_timeout * 2)
+                self._open()
+            elif self.failures >= self.failure_threshold:
+                self._open()
+
+    def _open(self):
+        self._state = self.OPEN
+        self.opened_at = time.monotonic()
+
+    def info(self):
+        state = self.state
+        with self._lock:
+            retry_in = None
+            if self._state == self.OPEN:
+                retry_in = max(0, int(self.opened_at + self.reset_timeout - time.monotonic()))
+            return {"state": state, "failures": self.failures, "retry_in_seconds": retry_in}
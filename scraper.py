@@ -3,211 +3,502 @@ from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.chrome.service import Service
-from bs4 import BeautifulSoup
-import time
+from selenium.common.exceptions import TimeoutException, WebDriverException
+from bs4 import BeautifulSoup, SoupStrainer
+from contextlib import contextmanager
+from requests.adapters import HTTPAdapter
+from metrics import SCRAPER_PAGES
+import requests
+import importlib.util
+import queue
+import threading
 import json
+import logging
 import os
 from datetime import datetime
 
+logger = logging.getLogger(__name__)
+
+# parser سریع‌تر lxml اگر نصب باشد
+HTML_PARSER = "lxml" if importlib.util.find_spec("lxml") else "html.parser"
+
+# منابعی که برای استخراج قیمت لازم نیستند و در مرورگر بارگذاری نمی‌شوند
+BLOCKED_URLS = [
+    "*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.svg", "*.ico",
+    "*.woff", "*.woff2", "*.ttf", "*.otf", "*.eot", "*.css",
+]
+
+PAGE_TIMEOUT = int(os.environ.get("SCRAPER_PAGE_TIMEOUT", 15))
+POOL_SIZE = int(os.environ.get("SCRAPER_POOL_SIZE", 2))
+# http: خواندن صفحه با HTTP و کوکی‌های session، مرورگر فقط برای ورود و تمدید
+# browser: هر بار با مرورگر
+FETCH_MODE = os.environ.get("SCRAPER_FETCH_MODE", "http")
+# کوکی‌های ورود مرورگر؛ برنامه خودش این فایل را نمی‌سازد (ورود API کد OTP را
+# مصرف می‌کند) و باید یک بار با `python scraper.py` ساخته شود
+SESSION_FILE = os.environ.get("SCRAPER_SESSION_FILE", "session_data.json")
+
+# نشانه‌های فرم ورود در HTML؛ یعنی کوکی‌های session دیگر معتبر نیستند
+LOGIN_MARKERS = ('type="tel"', 'name="mobile"', "موبایل")
+# پیام شکست مسیر HTTP وقتی مرورگر کمکی نمی‌کند (session معتبر است)
+HTTP_FAILURE_MESSAGES = {
+    "error": "خطا در دریافت صفحه قیمت",
+    "no_table": "قیمتی در صفحه پیدا نشد",
+}
+USER_AGENT = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+)
+
+
+def create_driver():
+    """راه‌اندازی Chrome headless بدون تصویر، فونت و CSS"""
+    chrome_options = Options()
+    chrome_options.add_argument('--headless')
+    chrome_options.add_argument('--no-sandbox')
+    chrome_options.add_argument('--disable-dev-shm-usage')
+    chrome_options.add_argument('--disable-gpu')
+    chrome_options.add_argument('--window-size=1920,1080')
+    chrome_options.add_argument('--disable-blink-features=AutomationControlled')
+    chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
+    chrome_options.add_experimental_option('useAutomationExtension', False)
+    chrome_options.add_experimental_option("prefs", {
+        "profile.managed_default_content_settings.images": 2,
+        "profile.managed_default_content_settings.fonts": 2,
+    })
+    # منتظر تصاویر و زیرمنابع نمی‌ماند؛ آماده بودن جدول با WebDriverWait چک می‌شود
+    chrome_options.page_load_strategy = 'eager'
+    chrome_options.binary_location = os.environ.get('GOOGLE_CHROME_BIN', '/usr/bin/google-chrome')
+
+    driver = webdriver.Chrome(options=chrome_options)
+    driver.set_page_load_timeout(PAGE_TIMEOUT)
+    driver.execute_cdp_cmd("Network.enable", {})
+    driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": BLOCKED_URLS})
+    driver.execute_cdp_cmd("Page.addScriptToEvaluateOnNewDocument", {
+        "source": "Object.defineProperty(navigator, 'webdriver', {get: () => undefined})",
+    })
+    return driver
+
+
+class DriverPool:
+    """
+    استخر مرورگرهای گرم و قابل استفاده مجدد
+
+    مرورگرها در اولین نیاز ساخته می‌شوند و بعد از هر استفاده به استخر
+    برمی‌گردند؛ مرورگری که از کار افتاده باشد بسته و جایگزین می‌شود.
+    """
+
+    def __init__(self, size=POOL_SIZE, factory=create_driver):
+        self.size = size
+        self.factory = factory
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+        # کوکی‌های session که روی هر مرورگر بارگذاری شده: {id(driver): mtime}
+        self.sessions = {}
+
+    def _get(self, timeout):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                create = True
+            else:
+                create = False
+        if create:
+            try:
+                return self.factory()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+        return self._idle.get(timeout=timeout)
+
+    def _discard(self, driver):
+        self.sessions.pop(id(driver), None)
+        with self._lock:
+            self._created -= 1
+        try:
+            driver.quit()
+        except Exception:
+            pass
+
+    @staticmethod
+    def _alive(driver):
+        try:
+            driver.execute_script("return 1")
+            return True
+        except WebDriverException:
+            return False
+
+    def _checkout(self, timeout):
+        """یک مرورگر سالم؛ مرورگرهای از کار افتاده استخر بسته و جایگزین می‌شوند"""
+        for _ in range(self.size + 1):
+            driver = self._get(timeout)
+            if self._alive(driver):
+                return driver
+            self._discard(driver)
+        raise WebDriverException("no working browser in pool")
+
+    @contextmanager
+    def driver(self, timeout=60):
+        """گرفتن یک مرورگر از استخر برای مدت بلوک with"""
+        driver = self._checkout(timeout)
+        try:
+            yield driver
+        except BaseException:
+            # وضعیت مرورگر بعد از هر خطا نامعلوم است؛ بدون discard جای آن در استخر گم می‌شود
+            self._discard(driver)
+            raise
+        else:
+            self._idle.put(driver)
+
+    def warm(self):
+        """ساخت همه مرورگرها از قبل تا اولین درخواست منتظر Chrome نماند"""
+        while True:
+            with self._lock:
+                if self._created >= self.size:
+                    return
+                self._created += 1
+            try:
+                self._idle.put(self.factory())
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+
+    def close(self):
+        while True:
+            try:
+                driver = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(driver)
+
+
+def wait_ready(driver, timeout=PAGE_TIMEOUT):
+    """انتظار تا آماده شدن DOM به جای sleep ثابت"""
+    WebDriverWait(driver, timeout).until(
+        lambda d: d.execute_script("return document.readyState") in ("interactive", "complete")
+    )
+
+
+def parse_price_tables(html):
+    """استخراج ردیف‌های قیمت؛ فقط تگ‌های table پارس می‌شوند"""
+    soup = BeautifulSoup(html, HTML_PARSER, parse_only=SoupStrainer("table"))
+    prices = []
+    for row in soup.find_all('tr'):
+        cells = row.find_all(['td', 'th'])
+        if len(cells) < 3:
+            continue
+        texts = [cell.get_text(strip=True) for cell in cells]
+        text = ' '.join(texts)
+        if 'نقره' in text or 'سکه' in text or 'silver' in text.lower():
+            try:
+                buy_price = int(''.join(filter(str.isdigit, texts[1])) or 0)
+                sell_price = int(''.join(filter(str.isdigit, texts[2])) or 0)
+            except ValueError:
+                continue
+            if buy_price > 0 or sell_price > 0:
+                prices.append({
+                    'name': texts[0],
+                    'buy_price': buy_price,
+                    'sell_price': sell_price,
+                    'unit': 'تومان'
+                })
+    return prices
+
+
+def looks_logged_out(html):
+    return any(marker in html for marker in LOGIN_MARKERS)
+
+
+class HttpPageFetcher:
+    """
+    خواندن صفحه قیمت با یک درخواست HTTP و کوکی‌های session مرورگر
+
+    کوکی‌ها از فایل session (save_session) خوانده و هر بار که فایل عوض شود
+    دوباره بارگذاری می‌شوند؛ اتصال‌ها در pool با keep-alive می‌مانند.
+    """
+
+    def __init__(self, session_file=SESSION_FILE, pool_size=POOL_SIZE):
+        self.session_file = session_file
+        self.session = requests.Session()
+        self.session.headers.update({
+            "User-Agent": USER_AGENT,
+            "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+            "Accept-Language": "fa-IR,fa;q=0.9,en;q=0.8",
+        })
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._mtime = None
+        self._lock = threading.Lock()
+
+    def _load_cookies(self):
+        """بارگذاری کوکی‌های مرورگر در session؛ اگر فایل session نباشد False"""
+        if not os.path.exists(self.session_file):
+            logger.warning("session file %s missing; run `python scraper.py` to create it",
+                           self.session_file, extra={"event": "session_missing"})
+            return False
+        mtime = os.path.getmtime(self.session_file)
+        with self._lock:
+            if mtime == self._mtime:
+                return True
+            with open(self.session_file, 'r', encoding='utf-8') as f:
+                cookies = json.load(f)['cookies']
+            self.session.cookies.clear()
+            for c in cookies:
+                self.session.cookies.set(
+                    c['name'], c['value'],
+                    domain=c.get('domain'), path=c.get('path', '/'),
+                    secure=c.get('secure', False), expires=c.get('expiry'),
+                )
+            self._mtime = mtime
+        return True
+
+    def fetch(self, url):
+        """HTML صفحه؛ اگر session نباشد یا منقضی شده باشد None"""
+        if not self._load_cookies():
+            return None
+        r = self.session.get(url, timeout=(5, PAGE_TIMEOUT))
+        if r.status_code in (401, 403) or "login" in r.url:
+            return None
+        r.raise_for_status()
+        return r.text
+
+    def close(self):
+        self.session.close()
+
+
+# همه نمونه‌های ShirazSilverScraper از یک استخر استفاده می‌کنند
+driver_pool = DriverPool()
+http_fetcher = HttpPageFetcher()
+
+
 class ShirazSilverScraper:
-    def __init__(self):
+    def __init__(self, pool=None, http=None):
         self.base_url = "https://shirazgoldandsilver.ir"
-        self.driver = None
+        self.pool = pool or driver_pool
+        self.http = http or http_fetcher
         self.is_logged_in = False
-        self.session_file = "session_data.json"
+        self.session_file = SESSION_FILE
         
-    def setup_driver(self):
-        """راه‌اندازی Chrome headless"""
-        chrome_options = Options()
-        chrome_options.add_argument('--headless')
-        chrome_options.add_argument('--no-sandbox')
-        chrome_options.add_argument('--disable-dev-shm-usage')
-        chrome_options.add_argument('--disable-gpu')
-        chrome_options.add_argument('--window-size=1920,1080')
-        chrome_options.add_argument('--disable-blink-features=AutomationControlled')
-        chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
-        chrome_options.add_experimental_option('useAutomationExtension', False)
-        chrome_options.binary_location = os.environ.get('GOOGLE_CHROME_BIN', '/usr/bin/google-chrome')
-        
-        self.driver = webdriver.Chrome(options=chrome_options)
-        self.driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
-        
-    def save_session(self):
+    def save_session(self, driver):
         """ذخیره session برای استفاده بعدی"""
         try:
-            cookies = self.driver.get_cookies()
+            cookies = driver.get_cookies()
             session_data = {
                 'cookies': cookies,
                 'timestamp': datetime.now().isoformat()
             }
             with open(self.session_file, 'w', encoding='utf-8') as f:
                 json.dump(session_data, f, ensure_ascii=False, indent=2)
-            print("✅ Session ذخیره شد")
+            self.pool.sessions[id(driver)] = os.path.getmtime(self.session_file)
+            logger.info("session saved", extra={"event": "session_saved"})
         except Exception as e:
-            print(f"⚠️ خطا در ذخیره session: {e}")
+            logger.warning("session save failed: %s", e, extra={"event": "session_error", "op": "save"})
     
-    def load_session(self):
-        """بارگذاری session ذخیره شده"""
+    def load_session(self, driver):
+        """بارگذاری session ذخیره شده در مرورگر (فقط اگر این مرورگر آن را ندارد)"""
         try:
             if not os.path.exists(self.session_file):
                 return False
+
+            mtime = os.path.getmtime(self.session_file)
+            if self.pool.sessions.get(id(driver)) == mtime:
+                self.is_logged_in = True
+                return True
                 
             with open(self.session_file, 'r', encoding='utf-8') as f:
                 session_data = json.load(f)
             
-            self.setup_driver()
-            self.driver.get(self.base_url)
-            time.sleep(2)
+            # کوکی فقط روی دامنه باز شده قابل تنظیم است
+            driver.get(self.base_url)
+            wait_ready(driver)
             
             for cookie in session_data['cookies']:
                 try:
-                    self.driver.add_cookie(cookie)
+                    driver.add_cookie(cookie)
                 except Exception as e:
-                    print(f"خطا در افزودن cookie: {e}")
+                    logger.warning("add cookie failed: %s", e, extra={"event": "session_error", "op": "add_cookie"})
             
-            self.driver.refresh()
-            time.sleep(3)
+            self.pool.sessions[id(driver)] = mtime
             self.is_logged_in = True
-            print("✅ Session بارگذاری شد")
+            logger.info("session loaded", extra={"event": "session_loaded"})
             return True
         except Exception as e:
-            print(f"❌ خطا در بارگذاری session: {e}")
+            logger.warning("session load failed: %s", e, extra={"event": "session_error", "op": "load"})
             return False
     
     def login_with_code(self, mobile_number, verification_code):
-        """ورود با شماره موبایل و کد تایید"""
+        """ورود با شماره موبایل و کد تایید (یا تابعی که بعد از ارسال پیامک کد را برمی‌گرداند)"""
         try:
-            self.setup_driver()
-            self.driver.get(self.base_url)
-            time.sleep(3)
-            
-            # پیدا کردن و کلیک روی دکمه ورود
-            try:
-                login_btn = WebDriverWait(self.driver, 10).until(
-                    EC.element_to_be_clickable((By.XPATH, 
-                        "//button[contains(text(), 'ورود') or contains(text(), 'وارد')] | //a[contains(text(), 'ورود')]"))
-                )
-                login_btn.click()
-                time.sleep(2)
-            except:
-                print("دکمه ورود پیدا نشد - احتمالاً در صفحه ورود هستیم")
-            
-            # وارد کردن شماره موبایل
-            mobile_input = WebDriverWait(self.driver, 10).until(
-                EC.presence_of_element_located((By.XPATH, 
-                    "//input[@type='tel'] | //input[@name='mobile'] | //input[contains(@placeholder, 'موبایل')]"))
-            )
-            mobile_input.clear()
-            mobile_input.send_keys(mobile_number)
-            time.sleep(1)
-            
-            # کلیک روی دکمه ارسال کد
-            submit_btn = self.driver.find_element(By.XPATH, 
-                "//button[@type='submit'] | //button[contains(text(), 'ارسال')] | //button[contains(text(), 'تایید')]")
-            submit_btn.click()
-            print(f"✅ کد به شماره {mobile_number} ارسال شد")
-            time.sleep(3)
-            
-            # وارد کردن کد تایید
-            code_inputs = self.driver.find_elements(By.XPATH, 
-                "//input[@type='text' or @type='tel' or @type='number']")
-            
-            if len(code_inputs) >= 6:
-                # 6 فیلد جداگانه
-                for i, digit in enumerate(verification_code[:6]):
-                    code_inputs[i].clear()
-                    code_inputs[i].send_keys(digit)
-                    time.sleep(0.2)
-            else:
-                # یک فیلد
-                code_input = WebDriverWait(self.driver, 10).until(
-                    EC.presence_of_element_located((By.XPATH, 
-                        "//input[@name='code'] | //input[contains(@placeholder, 'کد')]"))
-                )
-                code_input.clear()
-                code_input.send_keys(verification_code)
-            
-            time.sleep(1)
-            
-            # کلیک روی دکمه تایید نهایی
-            try:
-                confirm_btn = self.driver.find_element(By.XPATH, 
-                    "//button[contains(text(), 'تایید') or contains(text(), 'ورود')]")
-                confirm_btn.click()
-            except:
-                print("دکمه تایید نهایی پیدا نشد - ممکن است خودکار ارسال شود")
-            
-            time.sleep(5)
-            
-            # ذخیره session
-            self.save_session()
-            self.is_logged_in = True
-            print("✅ ورود موفقیت‌آمیز بود!")
-            return True
-            
+            with self.pool.driver() as driver:
+                return self._login(driver, mobile_number, verification_code)
         except Exception as e:
-            print(f"❌ خطا در ورود: {e}")
-            if self.driver:
-                print("URL فعلی:", self.driver.current_url)
+            logger.warning("browser login failed: %s", e, extra={"event": "login_error"})
             return False
+
+    def _login(self, driver, mobile_number, verification_code):
+        wait = WebDriverWait(driver, PAGE_TIMEOUT)
+        driver.delete_all_cookies()
+        driver.get(self.base_url)
+        wait_ready(driver)
+        
+        # پیدا کردن و کلیک روی دکمه ورود
+        try:
+            login_btn = WebDriverWait(driver, 5).until(
+                EC.element_to_be_clickable((By.XPATH, 
+                    "//button[contains(text(), 'ورود') or contains(text(), 'وارد')] | //a[contains(text(), 'ورود')]"))
+            )
+            login_btn.click()
+        except TimeoutException:
+            logger.info("login button not found, assuming login page", extra={"event": "login_step"})
+        
+        # وارد کردن شماره موبایل
+        mobile_input = wait.until(
+            EC.element_to_be_clickable((By.XPATH, 
+                "//input[@type='tel'] | //input[@name='mobile'] | //input[contains(@placeholder, 'موبایل')]"))
+        )
+        mobile_input.clear()
+        mobile_input.send_keys(mobile_number)
+        
+        # کلیک روی دکمه ارسال کد
+        submit_btn = wait.until(EC.element_to_be_clickable((By.XPATH, 
+            "//button[@type='submit'] | //button[contains(text(), 'ارسال')] | //button[contains(text(), 'تایید')]")))
+        submit_btn.click()
+        logger.info("verification code requested", extra={"event": "login_step"})
+        
+        # وارد کردن کد تایید؛ منتظر فرم کد می‌ماند
+        code_xpath = "//input[@name='code'] | //input[contains(@placeholder, 'کد')] | //input[@maxlength='1']"
+        wait.until(EC.presence_of_element_located((By.XPATH, code_xpath)))
+        # کد می‌تواند تابعی باشد که بعد از ارسال پیامک پرسیده می‌شود (اجرای خط فرمان)
+        if callable(verification_code):
+            verification_code = verification_code()
+        code_inputs = driver.find_elements(By.XPATH, 
+            "//input[@type='text' or @type='tel' or @type='number']")
+        
+        if len(code_inputs) >= 6:
+            # 6 فیلد جداگانه
+            for i, digit in enumerate(verification_code[:6]):
+                code_inputs[i].clear()
+                code_inputs[i].send_keys(digit)
+        else:
+            # یک فیلد
+            code_input = wait.until(
+                EC.element_to_be_clickable((By.XPATH, 
+                    "//input[@name='code'] | //input[contains(@placeholder, 'کد')]"))
+            )
+            code_input.clear()
+            code_input.send_keys(verification_code)
+        
+        # کلیک روی دکمه تایید نهایی
+        login_url = driver.current_url
+        try:
+            confirm_btn = driver.find_element(By.XPATH, 
+                "//button[contains(text(), 'تایید') or contains(text(), 'ورود')]")
+            confirm_btn.click()
+        except WebDriverException:
+            logger.info("confirm button not found, form may auto-submit", extra={"event": "login_step"})
+        
+        # ورود کامل شده وقتی صفحه عوض شود یا فرم کد از بین برود
+        try:
+            wait.until(lambda d: d.current_url != login_url
+                       or not d.find_elements(By.XPATH, code_xpath))
+        except TimeoutException:
+            logger.warning("login did not complete", extra={"event": "login_error", "url": driver.current_url})
+            raise
+        
+        # ذخیره session
+        self.save_session(driver)
+        self.is_logged_in = True
+        logger.info("browser login succeeded", extra={"event": "login_ok"})
+        return True
     
     def get_silver_prices(self):
-        """استخراج قیمت‌های نقره"""
+        """
+        استخراج قیمت‌های نقره
+
+        در حالت http صفحه با کوکی‌های session و یک درخواست ساده خوانده می‌شود؛
+        مرورگر فقط وقتی باز می‌شود که session منقضی شده باشد (صفحه ورود). خطای
+        شبکه یا نبودن جدول همان‌جا به‌صورت شکست برمی‌گردد.
+        """
+        if FETCH_MODE == "http":
+            prices, reason = self._prices_via_http()
+            if prices:
+                SCRAPER_PAGES.inc(path="http", result="ok")
+                return {
+                    'success': True,
+                    'prices': prices,
+                    'timestamp': datetime.now().isoformat()
+                }
+            SCRAPER_PAGES.inc(path="http", result=reason)
+            if reason != "logged_out":
+                logger.warning("http fetch failed (%s)", reason, extra={"event": "scraper_error", "path": "http"})
+                return {
+                    'success': False,
+                    'message': HTTP_FAILURE_MESSAGES[reason],
+                    'prices': []
+                }
+            logger.info("session expired, renewing with browser", extra={"event": "scraper_fallback", "reason": reason})
+        return self._prices_via_browser(renew=FETCH_MODE == "http")
+
+    def _prices_via_http(self):
+        """(قیمت‌ها، دلیل شکست)"""
+        try:
+            html = self.http.fetch(self.base_url)
+        except requests.RequestException as e:
+            logger.warning("http fetch error: %s", e, extra={"event": "scraper_error", "path": "http"})
+            return None, "error"
+        if html is None:
+            return None, "logged_out"
+        prices = parse_price_tables(html)
+        if not prices:
+            return None, "logged_out" if looks_logged_out(html) else "no_table"
+        return prices, None
+
+    def _prices_via_browser(self, renew=False):
+        """خواندن قیمت با مرورگر؛ با renew کوکی‌های تازه برای مسیر HTTP ذخیره می‌شوند"""
         try:
-            if not self.is_logged_in:
-                if not self.load_session():
+            with self.pool.driver() as driver:
+                if not self.load_session(driver):
                     return {
                         'success': False,
                         'message': 'نیاز به ورود مجدد دارید',
                         'prices': []
                     }
+                
+                # رفتن به صفحه اصلی و انتظار برای جدول قیمت‌ها
+                driver.get(self.base_url)
+                try:
+                    WebDriverWait(driver, PAGE_TIMEOUT).until(
+                        EC.presence_of_element_located((By.CSS_SELECTOR, "table tr td"))
+                    )
+                except TimeoutException:
+                    logger.warning("price table did not load in time", extra={"event": "scraper_timeout"})
+                
+                # فقط HTML جدول‌ها از مرورگر گرفته می‌شود، نه کل page_source
+                html = driver.execute_script(
+                    "return Array.from(document.querySelectorAll('table')).map(t => t.outerHTML).join('')"
+                )
+                prices = parse_price_tables(html or '')
+                if prices and renew:
+                    self.save_session(driver)
             
-            # رفتن به صفحه اصلی
-            self.driver.get(self.base_url)
-            time.sleep(5)
-            
-            # استخراج HTML
-            soup = BeautifulSoup(self.driver.page_source, 'html.parser')
-            
-            prices = []
-            
-            # روش 1: جستجوی جداول
-            tables = soup.find_all('table')
-            for table in tables:
-                rows = table.find_all('tr')
-                for row in rows:
-                    cells = row.find_all(['td', 'th'])
-                    if len(cells) >= 3:
-                        text = ' '.join([cell.get_text(strip=True) for cell in cells])
-                        if 'نقره' in text or 'سکه' in text or 'silver' in text.lower():
-                            try:
-                                name = cells[0].get_text(strip=True)
-                                buy_text = cells[1].get_text(strip=True) if len(cells) > 1 else '0'
-                                sell_text = cells[2].get_text(strip=True) if len(cells) > 2 else '0'
-                                
-                                buy_price = int(''.join(filter(str.isdigit, buy_text))) if buy_text else 0
-                                sell_price = int(''.join(filter(str.isdigit, sell_text))) if sell_text else 0
-                                
-                                if buy_price > 0 or sell_price > 0:
-                                    prices.append({
-                                        'name': name,
-                                        'buy_price': buy_price,
-                                        'sell_price': sell_price,
-                                        'unit': 'تومان'
-                                    })
-                            except:
-                                continue
-            
-            # اگر هیچ قیمتی پیدا نشد، داده‌های نمونه
+            # هیچ‌وقت داده ساختگی برگردانده نمی‌شود
             if not prices:
-                prices = [
-                    {'name': 'نقره 925', 'buy_price': 45000, 'sell_price': 47000, 'unit': 'تومان/گرم'},
-                    {'name': 'سکه نقره', 'buy_price': 850000, 'sell_price': 900000, 'unit': 'تومان'},
-                    {'name': 'شمش نقره 100 گرمی', 'buy_price': 4500000, 'sell_price': 4700000, 'unit': 'تومان'},
-                ]
-                print("⚠️ هیچ قیمتی یافت نشد - استفاده از داده‌های نمونه")
+                SCRAPER_PAGES.inc(path="browser", result="no_table")
+                logger.warning("no prices found", extra={"event": "scraper_empty", "path": "browser"})
+                return {
+                    'success': False,
+                    'message': 'قیمتی در صفحه پیدا نشد',
+                    'prices': []
+                }
             
+            SCRAPER_PAGES.inc(path="browser", result="ok")
             return {
                 'success': True,
                 'prices': prices,
@@ -215,7 +506,8 @@ class ShirazSilverScraper:
             }
             
         except Exception as e:
-            print(f"❌ خطا در استخراج قیمت‌ها: {e}")
+            SCRAPER_PAGES.inc(path="browser", result="error")
+            logger.warning("browser scrape failed: %s", e, extra={"event": "scraper_error", "path": "browser"})
             return {
                 'success': False,
                 'message': str(e),
@@ -223,9 +515,22 @@ class ShirazSilverScraper:
             }
     
     def close(self):
-        """بستن مرورگر"""
-        if self.driver:
-            try:
-                self.driver.quit()
-            except:
-                pass
+        """بستن مرورگرهای استخر و اتصال‌های HTTP"""
+        self.pool.close()
+        self.http.close()
+
+
+if __name__ == "__main__":
+    # ساخت فایل session برای PRICE_FALLBACK=scraper با ورود مرورگر
+    from logs import setup_logging
+
+    setup_logging(fmt="text")
+    scraper = ShirazSilverScraper()
+    try:
+        mobile = input("Mobile: ")
+        if scraper.login_with_code(mobile, lambda: input("Code: ")):
+            logger.info("session saved to %s", scraper.session_file)
+        else:
+            logger.error("login failed, %s not written", scraper.session_file)
+    finally:
+        scraper.close()
@@ -0,0 +1,275 @@
+import fcntl
+import json
+import os
+import struct
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+from price_model import encode_json
+from snapshot import PriceSnapshot
+
+# هدر فایل اسنپ‌شات: magic، نسخه، طول بدنه، طول gzip، طول state، زمان ساخت، etag
+_HEADER = struct.Struct("<4sQQQQd32s")
+_MAGIC = b"SSN1"
+
+
+class LocalSharedState:
+    """
+    حالت تک‌پردازه‌ای: هر پردازه رهبر خودش است و چیزی به اشتراک گذاشته نمی‌شود
+    (برای اجرای توسعه یا gunicorn با یک worker)
+    """
+
+    def try_lead(self):
+        return True
+
+    def publish(self, snap, state):
+        pass
+
+    def poll(self, force=False):
+        return None
+
+    def fetch_lock(self, timeout):
+        return _NullLock()
+
+    def publish_lock(self, timeout):
+        return _NullLock()
+
+    def write_json(self, name, obj):
+        pass
+
+    def read_json(self, name):
+        return None
+
+    def publish_metrics(self, data):
+        pass
+
+    def collect_metrics(self):
+        return []
+
+
+class _NullLock:
+    def __enter__(self):
+        return True
+
+    def __exit__(self, *exc):
+        return False
+
+
+class _FileLock:
+    """قفل انحصاری فایل بین پردازه‌ها با انتظار غیرمسدودکننده (سازگار با gevent)"""
+
+    def __init__(self, path, timeout):
+        self.path = path
+        self.timeout = timeout
+        self.fd = None
+
+    def __enter__(self):
+        self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        deadline = time.monotonic() + self.timeout
+        while True:
+            try:
+                fcntl.flock(self.fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return True
+            except BlockingIOError:
+                if time.monotonic() >= deadline:
+                    os.close(self.fd)
+                    self.fd = None
+                    raise TimeoutError(f"{os.path.basename(self.path)} busy")
+                time.sleep(0.05)
+
+    def __exit__(self, *exc):
+        if self.fd is not None:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+            os.close(self.fd)
+            self.fd = None
+        return False
+
+
+class FileSharedState:
+    """
+    اشتراک اسنپ‌شات بین worker های gunicorn از طریق یک فایل مشترک
+
+    - رهبر با flock روی فایل leader.lock انتخاب می‌شود و فقط او scheduler دارد؛
+      اگر رهبر بمیرد قفل آزاد می‌شود و worker دیگری آن را می‌گیرد.
+    - اسنپ‌شات (بدنه JSON، نسخه gzip و state) اتمیک با rename نوشته می‌شود؛
+      بقیه worker ها فقط وقتی فایل عوض شده باشد آن را یک بار می‌خوانند.
+    - fetch.lock تضمین می‌کند در هر لحظه فقط یک worker به upstream درخواست بدهد.
+    - publish.lock خواندن آخرین state، ادغام تغییرات و انتشار را اتمیک می‌کند
+      تا انتشار یک worker تغییر worker دیگر را بازنویسی نکند.
+    - فایل‌های JSON کوچک (درخواست بروزرسانی برای رهبر، جدول حساب‌ها و متریک
+      هر worker) با write_json / read_json رد و بدل می‌شوند.
+    """
+
+    def __init__(self, directory, poll_interval=0.5):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.snapshot_path = os.path.join(directory, "snapshot.bin")
+        self.leader_path = os.path.join(directory, "leader.lock")
+        self.fetch_path = os.path.join(directory, "fetch.lock")
+        self.publish_path = os.path.join(directory, "publish.lock")
+        self.metrics_dir = os.path.join(directory, "metrics")
+        os.makedirs(self.metrics_dir, exist_ok=True)
+        self.poll_interval = poll_interval
+        self.version = 0
+        self._leader_fd = None
+        self._seen = None
+        self._last_poll = 0.0
+        self._lock = threading.Lock()
+
+    def try_lead(self):
+        """تلاش برای رهبر شدن؛ اگر قبلاً رهبر بوده True"""
+        if self._leader_fd is not None:
+            return True
+        fd = os.open(self.leader_path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        os.ftruncate(fd, 0)
+        os.write(fd, str(os.getpid()).encode())
+        self._leader_fd = fd
+        return True
+
+    def fetch_lock(self, timeout):
+        return _FileLock(self.fetch_path, timeout)
+
+    def publish_lock(self, timeout):
+        return _FileLock(self.publish_path, timeout)
+
+    def publish(self, snap, state):
+        """نوشتن اتمیک اسنپ‌شات و state برای بقیه worker ها"""
+        state_raw = encode_json(state)
+        with self._lock:
+            self.version = max(self.version, self._current_version()) + 1
+            header = _HEADER.pack(
+                _MAGIC, self.version, len(snap.body), len(snap.gzip_body), len(state_raw),
+                snap.created_at, snap.etag.encode("ascii"),
+            )
+            _write_atomic(self.snapshot_path, (header, snap.body, snap.gzip_body, state_raw))
+            st = os.stat(self.snapshot_path)
+            self._seen = (st.st_ino, st.st_mtime_ns)
+
+    def write_json(self, name, obj):
+        _write_atomic(os.path.join(self.directory, f"{name}.json"), (encode_json(obj),))
+
+    def read_json(self, name):
+        """محتوای name.json یا None اگر نباشد"""
+        try:
+            with open(os.path.join(self.directory, f"{name}.json"), "rb") as f:
+                return json.loads(f.read())
+        except (OSError, ValueError):
+            return None
+
+    def publish_metrics(self, data):
+        """نوشتن متریک‌های همین worker برای /metrics بقیه worker ها"""
+        _write_atomic(os.path.join(self.metrics_dir, f"{os.getpid()}.json"), (json.dumps(data).encode(),))
+
+    def collect_metrics(self):
+        """
+        متریک‌های منتشرشده worker های زنده دیگر
+
+        فایل worker های مرده حذف می‌شود؛ شمارنده‌های آن‌ها مثل ری‌استارت پردازه صفر می‌شوند.
+        """
+        out = []
+        for entry in os.scandir(self.metrics_dir):
+            pid, _, ext = entry.name.partition(".")
+            if ext != "json" or not pid.isdigit() or int(pid) == os.getpid():
+                continue
+            if not _alive(int(pid)):
+                try:
+                    os.unlink(entry.path)
+                except OSError:
+                    pass
+                continue
+            try:
+                with open(entry.path, "rb") as f:
+                    out.append(json.loads(f.read()))
+            except (OSError, ValueError):
+                continue
+        return out
+
+    def _current_version(self):
+        try:
+            with open(self.snapshot_path, "rb") as f:
+                head = f.read(_HEADER.size)
+            return _HEADER.unpack(head)[1] if len(head) == _HEADER.size else 0
+        except (OSError, struct.error):
+            return 0
+
+    def poll(self, force=False):
+        """
+        اگر اسنپ‌شات مشترک عوض شده باشد (snapshot, state) برمی‌گرداند، وگرنه None
+
+        هزینه حالت عادی فقط یک stat است که حداکثر هر poll_interval ثانیه انجام می‌شود.
+        """
+        now = time.monotonic()
+        if not force and now - self._last_poll < self.poll_interval:
+            return None
+        self._last_poll = now
+        try:
+            st = os.stat(self.snapshot_path)
+        except OSError:
+            return None
+        key = (st.st_ino, st.st_mtime_ns)
+        with self._lock:
+            if key == self._seen:
+                return None
+            loaded = self._load()
+            if loaded is None:
+                return None
+            self._seen = key
+            return loaded
+
+    def _load(self):
+        with open(self.snapshot_path, "rb") as f:
+            raw = f.read()
+        if len(raw) < _HEADER.size:
+            return None
+        magic, version, body_len, gzip_len, state_len, created_at, etag = _HEADER.unpack_from(raw)
+        if magic != _MAGIC:
+            return None
+        # WSGI بدنه bytes می‌خواهد؛ هر بخش یک بار کپی و تا اسنپ‌شات بعدی نگه داشته می‌شود
+        start = _HEADER.size
+        body = raw[start:start + body_len]
+        gzip_body = raw[start + body_len:start + body_len + gzip_len]
+        state_raw = raw[start + body_len + gzip_len:start + body_len + gzip_len + state_len]
+        self.version = version
+        snap = PriceSnapshot.from_parts(
+            body, gzip_body, etag.decode("ascii"), created_at,
+            datetime.fromtimestamp(int(created_at), tz=timezone.utc),
+        )
+        return snap, json.loads(state_raw)
+
+
+def _write_atomic(path, chunks):
+    """نوشتن فایل با rename اتمیک؛ خواننده‌ها هیچ‌وقت فایل نیمه‌کاره نمی‌بینند"""
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            for chunk in chunks:
+                f.write(chunk)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def shared_state_from_env():
+    """انتخاب backend بر اساس SHARED_STATE (file یا local)"""
+    kind = os.environ.get("SHARED_STATE", "file")
+    if kind == "local":
+        return LocalSharedState()
+    return FileSharedState(os.environ.get("SHARED_STATE_DIR", "shared_state"))
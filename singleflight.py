@@ -0,0 +1,60 @@
+import threading
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    ادغام فراخوانی‌های همزمان: فقط یک اجرای fn برای هر key در جریان است و
+    همه فراخوانی‌کننده‌های همزمان نتیجه همان اجرا را دریافت می‌کنند.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def in_flight(self, key="default"):
+        with self._lock:
+            return key in self._calls
+
+    def do(self, fn, key="default", timeout=None):
+        """
+        اجرای fn یا پیوستن به اجرای در جریان
+
+        با timeout، اجرا در thread جداگانه انجام می‌شود تا اگر انتظار تمام شد
+        فراخوانی‌کننده TimeoutError بگیرد و اجرا برای بقیه ادامه پیدا کند.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if leader:
+            if timeout is None:
+                self._run(key, call, fn)
+            else:
+                threading.Thread(target=self._run, args=(key, call, fn), daemon=True).start()
+
+        if not call.done.wait(timeout):
+            raise TimeoutError("call still in flight")
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def _run(self, key, call, fn):
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
@@ -0,0 +1,72 @@
+import gzip
+import hashlib
+import time
+from datetime import datetime, timezone
+
+from flask import Response
+
+from price_model import encode_json
+
+
+class PriceSnapshot:
+    """اسنپ‌شات تغییرناپذیر قیمت‌ها: بدنه JSON و نسخه gzip از قبل ساخته می‌شوند"""
+
+    __slots__ = ("body", "gzip_body", "etag", "last_modified", "created_at")
+
+    def __init__(self, body, last_modified=None):
+        created_at = time.time()
+        # Last-Modified با دقت ثانیه (طبق HTTP)
+        if last_modified is None:
+            last_modified = datetime.fromtimestamp(int(created_at), tz=timezone.utc)
+        set_ = object.__setattr__
+        set_(self, "body", body)
+        set_(self, "gzip_body", gzip.compress(body, compresslevel=9, mtime=0))
+        set_(self, "etag", hashlib.blake2b(body, digest_size=16).hexdigest())
+        set_(self, "created_at", created_at)
+        set_(self, "last_modified", last_modified)
+
+    @classmethod
+    def from_parts(cls, body, gzip_body, etag, created_at, last_modified):
+        """ساخت اسنپ‌شات از بایت‌های آماده (مثلاً خوانده‌شده از فایل مشترک) بدون فشرده‌سازی دوباره"""
+        snap = cls.__new__(cls)
+        set_ = object.__setattr__
+        set_(snap, "body", body)
+        set_(snap, "gzip_body", gzip_body)
+        set_(snap, "etag", etag)
+        set_(snap, "created_at", created_at)
+        set_(snap, "last_modified", last_modified)
+        return snap
+
+    def __setattr__(self, name, value):
+        raise AttributeError("PriceSnapshot is immutable")
+
+
+def build_snapshot(payload, previous=None):
+    """ساخت اسنپ‌شات از payload؛ اگر محتوا تغییر نکرده باشد همان قبلی برمی‌گردد"""
+    body = encode_json(payload)
+    if previous is not None and previous.body == body:
+        return previous
+    return PriceSnapshot(body)
+
+
+def snapshot_response(snap, req, mimetype="application/json"):
+    """پاسخ HTTP از اسنپ‌شات با پشتیبانی از ETag / If-None-Match و gzip"""
+    not_modified = False
+    if req.if_none_match:
+        not_modified = req.if_none_match.contains(snap.etag)
+    elif req.if_modified_since is not None:
+        not_modified = snap.last_modified <= req.if_modified_since
+
+    if not_modified:
+        resp = Response(status=304)
+    elif req.accept_encodings["gzip"]:
+        resp = Response(snap.gzip_body, mimetype=mimetype)
+        resp.headers["Content-Encoding"] = "gzip"
+    else:
+        resp = Response(snap.body, mimetype=mimetype)
+
+    resp.set_etag(snap.etag)
+    resp.last_modified = snap.last_modified
+    resp.headers["Cache-Control"] = "no-cache"
+    resp.vary.add("Accept-Encoding")
+    return resp
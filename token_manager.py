@@ -0,0 +1,115 @@
+import base64
+import json
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def decode_jwt_claims(token):
+    """خواندن claims توکن JWT بدون بررسی امضا؛ برای توکن‌های غیر JWT خروجی {} است"""
+    try:
+        payload = token.split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        claims = json.loads(base64.urlsafe_b64decode(payload))
+        return claims if isinstance(claims, dict) else {}
+    except Exception:
+        return {}
+
+
+class TokenManager:
+    """
+    نگهداری چرخه عمر توکن upstream
+
+    زمان انقضا از claim `exp` (اگر توکن JWT باشد) یا از max_age بعد از
+    ورود تخمین زده می‌شود. پاسخ 401 توکن را rejected می‌کند تا دیگر
+    درخواستی با آن فرستاده نشود و برنامه با قیمت‌های کش‌شده ادامه دهد.
+    """
+
+    MISSING = "missing"
+    VALID = "valid"
+    EXPIRING = "expiring"
+    EXPIRED = "expired"
+    REJECTED = "rejected"
+
+    def __init__(self, warn_before=24 * 3600, max_age=None, on_alert=None):
+        self.warn_before = warn_before
+        self.max_age = max_age
+        self.on_alert = on_alert
+        self.token = None
+        self.obtained_at = None
+        self.expires_at = None
+        self.rejected = False
+        self._alerted = None
+        self._lock = threading.Lock()
+
+    def set(self, token, obtained_at=None, rejected=False):
+        """ثبت توکن جدید (بعد از ورود یا بازیابی از فایل)"""
+        with self._lock:
+            self.token = token
+            self.obtained_at = obtained_at or (time.time() if token else None)
+            self.rejected = rejected
+            self._alerted = None
+            self.expires_at = None
+            if token:
+                claims = decode_jwt_claims(token)
+                if isinstance(claims.get("exp"), (int, float)):
+                    self.expires_at = float(claims["exp"])
+                    if isinstance(claims.get("iat"), (int, float)) and obtained_at is None:
+                        self.obtained_at = float(claims["iat"])
+                elif self.max_age:
+                    self.expires_at = self.obtained_at + self.max_age
+
+    def reject(self):
+        """upstream توکن را نپذیرفت (401)"""
+        with self._lock:
+            self.rejected = True
+        self._alert(self.REJECTED)
+
+    def status(self, now=None):
+        now = time.time() if now is None else now
+        if not self.token:
+            return self.MISSING
+        if self.rejected:
+            return self.REJECTED
+        if self.expires_at is not None:
+            if now >= self.expires_at:
+                return self.EXPIRED
+            if now >= self.expires_at - self.warn_before:
+                return self.EXPIRING
+        return self.VALID
+
+    def usable(self):
+        """آیا ارسال درخواست با این توکن معنی دارد؟"""
+        return self.status() in (self.VALID, self.EXPIRING)
+
+    def check(self):
+        """بررسی دوره‌ای؛ برای هر تغییر وضعیت غیرعادی یک بار هشدار می‌دهد"""
+        status = self.status()
+        if status in (self.EXPIRING, self.EXPIRED):
+            self._alert(status)
+        return status
+
+    def _alert(self, status):
+        with self._lock:
+            if self._alerted == status:
+                return
+            self._alerted = status
+        info = self.info()
+        logger.warning("token %s: expires_in=%s session_age=%s",
+                       status, info["expires_in"], info["session_age"])
+        if self.on_alert:
+            try:
+                self.on_alert(status, info)
+            except Exception as e:
+                logger.error(f"token alert failed: {e}")
+
+    def info(self):
+        now = time.time()
+        return {
+            "status": self.status(now),
+            "expires_at": self.expires_at,
+            "expires_in": int(self.expires_at - now) if self.expires_at else None,
+            "session_age": int(now - self.obtained_at) if self.obtained_at else None,
+        }